@@ -1,88 +1,112 @@
 
-import pandas as pd
-import altair as alt
-import numpy as np
-import tensorflow as tf
-
-import pyshark
-from sklearn.preprocessing import MinMaxScaler
-from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QLabel, QPushButton, QFileDialog, QWidget, QMessageBox, QListWidget, QScrollArea, QTextEdit, QLineEdit
+import os
+import metrics
+
+from pcap_reader import read_pcap
+from packet_store import PacketStore
+from flow_features import FlowTable
+from sharded_analysis import analyze_pcap
+from capture_cache import CaptureCache, cache_key
+from inference import get_model, CLASS_NAMES
+from charts import value_counts, draw_bar_chart
+from host_report import host_features, classify_hosts, HOST, PAIR
+from BackgroundJob import BackgroundJob
+from HostReportModel import HostReportModel
+from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFileDialog, QWidget, QMessageBox, QListWidget, QScrollArea, QTextEdit, QLineEdit, QProgressBar, QComboBox, QTableView, QHeaderView, QAbstractItemView
 from PySide6.QtCore import Qt
-from PySide6.QtWebEngineWidgets import QWebEngineView
-
-
-def extract_features_from_pcap(file_path, source_ip):
-    # 使用pyshark读取PCAP文件
-    cap = pyshark.FileCapture(file_path)
-
-    # 初始化各种变量以存储特征
-    total_fwd_bytes = 0
-    total_bwd_bytes = 0
-    fwd_packets = 0
-    bwd_packets = 0
-    bwd_packet_lengths = []
-    fwd_packet_lengths = []
-    psh_flags = 0
-    timestamps = []
-    init_win_bytes_forward = None
-
-    # 遍历PCAP文件中的每个数据包
-    for packet in cap:
-        # 检查数据包是否包含IP层
-        if hasattr(packet, 'ip'):
-            # 检查数据包是否包含TCP层
-            if hasattr(packet, 'tcp'):
-                # 判断此数据包是“向前”还是“向后”（根据源IP）
-                if packet.ip.src == source_ip:
-                    total_fwd_bytes += int(packet.tcp.len) # 计算向前的总字节数
-                    fwd_packets += 1  # 计算向前的数据包数量
-                    fwd_packet_lengths.append(int(packet.tcp.len))  # 存储每个向前的数据包长度
-                    # 存储向前的初始窗口大小（仅对第一个数据包）
-                    if init_win_bytes_forward is None:
-                        init_win_bytes_forward = int(packet.tcp.window_size_value)
-                else:
-                    total_bwd_bytes += int(packet.tcp.len) # 计算向后的总字节数
-                    bwd_packets += 1  # 计算向后的数据包数量
-                    bwd_packet_lengths.append(int(packet.tcp.len))  # 存储每个向后的数据包长度
-                
-                # 检查TCP数据包是否设置了PSH标志
-                if hasattr(packet.tcp, 'flags_psh') and packet.tcp.flags_psh == '1':
-                    psh_flags += 1  # 计算设置了PSH标志的数据包数量
-
-                # 存储数据包的时间戳
-                timestamps.append(float(packet.sniff_timestamp))
-
-    # 计算流持续时间（最后一个和第一个数据包的时间差）
-    flow_duration = max(timestamps) - min(timestamps) if timestamps else 0
-    # 计算流的到达时间的标准差
-    flow_iat_std = np.std(np.diff(timestamps)) if timestamps else 0
-    # 向后的数据包的最小长度
-    bwd_packet_length_min = min(bwd_packet_lengths) if bwd_packet_lengths else 0
-    # 向后的数据包长度的标准差
-    bwd_packet_length_std = np.std(bwd_packet_lengths) if bwd_packet_lengths else 0
-    # 向前的数据包长度的平均值
-    fwd_packet_length_mean = np.mean(fwd_packet_lengths) if fwd_packet_lengths else 0
-    # 每秒向后的数据包数量
-    bwd_packets_per_second = bwd_packets / flow_duration if flow_duration > 0 else 0
-    # 平均数据包大小
-    avg_packet_size = (total_fwd_bytes + total_bwd_bytes) / (fwd_packets + bwd_packets) if fwd_packets + bwd_packets > 0 else 0
-
-    # 返回提取的特征作为列表
-    return [
-        bwd_packet_length_min,
-        total_fwd_bytes,
-        total_fwd_bytes,
-        fwd_packet_length_mean,
-        bwd_packet_length_std,
-        flow_duration,
-        flow_iat_std,
-        init_win_bytes_forward,
-        bwd_packets_per_second,
-        psh_flags,
-        avg_packet_size
-    ]
-
-    
+
+
+# 超过该大小的文件使用多进程分片解析
+SHARD_MIN_BYTES = 64 * 1024 * 1024
+# 攻击检测每批推断的流数量，每批完成后发送增量结果
+DETECT_BATCH_ROWS = 65536
+# 主机检测报告的统计方式
+REPORT_MODES = [('按主机', HOST), ('按主机对', PAIR)]
+LOAD_SECONDS = metrics.histogram('sniff_load_seconds', '打开抓包文件到生成流特征的耗时（秒）')
+
+
+def load_capture(file_path, cache=None, progress=None, key=None):
+    # 读取抓包文件，返回(数据包记录, 列式数据包表, 流五元组列表, 流特征矩阵)，优先使用磁盘缓存
+    # progress(已完成量, 总量)在解析过程中定期调用；key为已计算的缓存键，读取和写入缓存共用
+    if cache is not None:
+        key = key or cache_key(file_path)
+        cached = cache.load(file_path, key)
+        if cached is not None:
+            store, flow_tuples, flow_features = cached
+            return [], store, flow_tuples, flow_features
+
+    if os.path.getsize(file_path) >= SHARD_MIN_BYTES:
+        # 大文件按字节范围分片，多进程解析并合并列式数据和流表
+        packets = []
+        store, flow_table = analyze_pcap(file_path, progress=progress)
+    else:
+        # 通过dpkt单次读取pcap文件，记录同时供分析表格和攻击检测使用
+        packets = list(read_pcap(file_path, progress=progress))
+        # 按列追加到预分配缓冲区，最后一次性生成DataFrame
+        store = PacketStore(capacity=max(len(packets), 1))
+        store.extend(packets)
+        flow_table = FlowTable()
+        flow_table.extend(packets)
+    flow_tuples, flow_features = flow_table.feature_matrix()
+
+    if cache is not None:
+        try:
+            cache.save(file_path, store, flow_tuples, flow_features, key)
+        except OSError:
+            pass  # 缓存写入失败不影响分析
+    return packets, store, flow_tuples, flow_features
+
+
+def load_job(job, file_path, cache):
+    # 工作线程：解析文件并生成DataFrame，同时返回缓存键供攻击检测读写缓存的主机特征
+    with LOAD_SECONDS.time():
+        key = cache_key(file_path)
+        packets, store, flow_tuples, flow_features = load_capture(
+            file_path, cache, progress=lambda done, total: job.report_progress(done, total, '解析数据包'), key=key)
+    job.report_progress(1, 1, '生成数据表')
+    return packets, flow_tuples, flow_features, store.to_dataframe(), key
+
+
+def count_fields_job(job, data, fields):
+    # 工作线程：逐个字段聚合计数，每个字段完成后作为增量结果发送
+    for row, field in enumerate(fields):
+        labels, counts = value_counts(data[field])
+        job.emit_partial((row, field, labels, counts))
+        job.report_progress(row + 1, len(fields), field)
+
+
+def detect_job(job, file_path, packets, source_ip, mode, host_report, flow_tuples, flow_features,
+               cache=None, key=None, batch_rows=DETECT_BATCH_ROWS):
+    # 工作线程：先生成（或复用缓存的）主机检测报告并查询源IP，再分批推断所有流，每批受到攻击的流作为增量结果发送
+    model = get_model()
+    if host_report is None:
+        # 主机特征与模型无关，优先读取磁盘缓存；未缓存时单次遍历计算，大文件或命中缓存未保留数据包记录时流式读取
+        hosts = cache.load_hosts(key, mode) if cache is not None and key else None
+        if hosts is None:
+            if not packets:
+                packets = read_pcap(file_path, progress=lambda done, total: job.report_progress(done, total, '计算主机特征'))
+            hosts = host_features(packets, mode)
+            if cache is not None and key:
+                try:
+                    cache.save_hosts(key, mode, hosts)
+                except OSError:
+                    pass  # 缓存写入失败不影响检测
+        host_report = classify_hosts(model, mode, *hosts)
+    job.emit_partial(('hosts', host_report))
+    if source_ip:
+        job.emit_partial(('source', [host_report.describe(row) for row in host_report.lookup(source_ip)]))
+
+    attacked = 0
+    for start in range(0, len(flow_tuples), batch_rows):
+        job.check_cancelled()
+        # 推理服务按训练集参数标准化，每批一次调用
+        predicted, _ = model.classify(flow_features[start:start + batch_rows])
+        hits = [(flow_tuples[start + i], CLASS_NAMES[label]) for i, label in enumerate(predicted.tolist()) if label != 0]
+        attacked += len(hits)
+        job.emit_partial(('flows', hits))
+        job.report_progress(min(start + batch_rows, len(flow_tuples)), len(flow_tuples), '攻击检测')
+    return host_report, len(flow_tuples), attacked
+
 
 class AnalyzeView(QMainWindow):
     def __init__(self):
@@ -127,16 +151,44 @@ class AnalyzeView(QMainWindow):
         self.source_ip_input = QLineEdit()
         self.source_ip_input.setPlaceholderText("输入源IP地址")
 
+        # 创建主机检测报告的统计方式下拉框和可排序表格
+        self.report_mode_combo = QComboBox()
+        for label, _ in REPORT_MODES:
+            self.report_mode_combo.addItem(label)
+        self.host_model = HostReportModel()
+        self.host_table = QTableView()
+        self.host_table.setModel(self.host_model)
+        self.host_table.setSortingEnabled(True)
+        self.host_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.host_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.host_table.horizontalHeader().resizeSection(0, 240)
+        self.host_table.setMaximumHeight(240)
+
+        # 创建后台任务的进度条和取消按钮
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_job)
+
         # 创建布局并添加控件
         layout = QVBoxLayout()
+        progress_layout = QHBoxLayout()
         layout.addWidget(self.open_file_button)
         layout.addWidget(QLabel("选择分析字段"))
         layout.addWidget(self.field_combo)
         layout.addWidget(self.analyze_button)
         layout.addWidget(QLabel("源IP地址"))
         layout.addWidget(self.source_ip_input)  # 添加源IP输入框
+        layout.addWidget(self.report_mode_combo)
         layout.addWidget(self.attack_detection_button)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        layout.addLayout(progress_layout)
         layout.addWidget(self.visualization_scroll_area)
+        layout.addWidget(QLabel("主机检测报告"))
+        layout.addWidget(self.host_table)
         layout.addWidget(self.result_text_edit)
 
         # 设置布局到主窗口
@@ -144,42 +196,75 @@ class AnalyzeView(QMainWindow):
         self.widget.setLayout(layout)
         self.setCentralWidget(self.widget)
 
-        self.data = pd.DataFrame()  # 保存的数据文件
+        self.data = None  # 保存的数据文件
+        self.chart_widget = None  # 复用的图表控件
+        self.packets = []  # 读取的数据包记录
+        self.flow_tuples = []  # 每条流的五元组
+        self.flow_features = None  # 每条流的特征矩阵
+        self.cache = CaptureCache()  # 解析结果的磁盘缓存
+        self.cache_key = None  # 当前文件的缓存键
+        self.host_reports = {}  # 按(文件, 修改时间, 统计方式)缓存的主机检测报告，再次查询时不重新解析
+        self.job = None  # 正在执行的后台任务
+
+    def start_job(self, fn, *args, on_finished=None, on_partial=None):
+        # 解析、统计和推断都在线程池中执行，界面只通过信号接收进度和结果
+        job = BackgroundJob(fn, *args)
+        job.signals.progress.connect(self.show_progress)
+        if on_partial is not None:
+            job.signals.partial.connect(on_partial)
+        if on_finished is not None:
+            job.signals.finished.connect(on_finished)
+        job.signals.failed.connect(self.show_job_error)
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(self.job_done)
+        self.job = job
+        self.set_busy(True)
+        job.start()
+
+    def set_busy(self, busy):
+        self.open_file_button.setEnabled(not busy)
+        self.analyze_button.setEnabled(not busy and self.data is not None)
+        self.attack_detection_button.setEnabled(not busy)
+        self.progress_bar.setVisible(busy)
+        self.cancel_button.setVisible(busy)
+        self.progress_bar.setValue(0)
+
+    def show_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        self.progress_bar.setFormat(f"{message} %p%")
+
+    def show_job_error(self, message):
+        QMessageBox.warning(self, "错误", message)
+
+    def job_done(self, *args):
+        self.set_busy(False)
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def closeEvent(self, event):
+        # 关闭窗口时取消正在执行的任务
+        self.cancel_job()
+        super().closeEvent(event)
 
     def open_file_dialog(self):
-        # 打开文件对话框选择pcap文件
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择数据文件", "./", "PCAP Files (*.pcap)")
-        self.file_path = file_path
+        # 打开文件对话框选择pcap文件，在后台线程中解析
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择数据文件", "./", "PCAP Files (*.pcap *.pcapng)")
         if file_path:
-            # 通过PyShark读取pcap文件数据
-            cap = pyshark.FileCapture(file_path)
-            for packet in cap:
-               if hasattr(packet, 'ip'): 
-                if hasattr(packet, 'tcp'):
-                    srcport = packet.tcp.srcport
-                    dstport = packet.tcp.dstport
-                elif hasattr(packet, 'udp'):
-                    srcport = packet.udp.srcport
-                    dstport = packet.udp.dstport
-                else:
-                    srcport = None
-                    dstport = None
-                
-                # 提取感兴趣的字段，例如源IP，目的IP，协议类型，数据包长度等
-                packet_data = {
-                    "Source IP": packet.ip.src,
-                    "Destination IP": packet.ip.dst,
-                    "Protocol": packet.transport_layer,
-                    "Length": packet.length,
-                    "Source Port": srcport,
-                    "Destination Port": dstport
-                }
-                self.data = pd.concat([self.data, pd.DataFrame(packet_data, index=[0])], ignore_index=True)
-
-            # 更新选择分析字段的下拉框
+            self.file_path = file_path
+            self.data = None
+            self.packets, self.flow_tuples, self.flow_features = [], [], None
+            self.cache_key = None
             self.field_combo.clear()
-            self.field_combo.addItems(self.data.columns)
-            self.analyze_button.setEnabled(True)
+            self.start_job(load_job, file_path, self.cache, on_finished=self.file_loaded)
+
+    def file_loaded(self, result):
+        self.packets, self.flow_tuples, self.flow_features, self.data, self.cache_key = result
+
+        # 更新选择分析字段的下拉框
+        self.field_combo.clear()
+        self.field_combo.addItems(self.data.columns)
 
     def analyze_data(self):
         # 获取选择的分析字段
@@ -191,70 +276,73 @@ class AnalyzeView(QMainWindow):
             QMessageBox.warning(self, "错误", "请选择有效的分析字段")
             return
         
-        # 清除可视化布局中之前的图表
-        for i in reversed(range(self.visualization_layout.count())):
-            self.visualization_layout.itemAt(i).widget().setParent(None)
-        
-        # 对每个选择的字段进行分析
-        for field in selected_fields:
-            # 使用Altair创建条形图
-            chart = alt.Chart(self.data).mark_bar().encode(
-                y=alt.X(f'{field}:N', title=field),
-                x=alt.Y('count()', title='Count')
-            ).properties(
-                width=800,
-                height=600,
-                title=f'{field}的分析结果'
-            ).configure_axis(
-            labelFontSize=14  # 设置轴标签字体大小
-        )
-
-            # 使用QWebEngineView显示HTML内容
-            web_view = QWebEngineView(self.visualization_widget)
-            web_view.setHtml(chart.to_html())
-            self.visualization_layout.addWidget(web_view)
+        # 复用同一个pyqtgraph图表控件，只在首次分析时导入并创建
+        if self.chart_widget is None:
+            import pyqtgraph as pg
+
+            self.chart_widget = pg.GraphicsLayoutWidget()
+            self.chart_widget.setBackground('w')
+            self.visualization_layout.addWidget(self.chart_widget)
+        self.chart_widget.clear()
+        self.chart_widget.setMinimumHeight(600 * len(selected_fields))
+
+        # 在后台线程中聚合计数，每个字段完成后立即绘制，图表只绘制前N项和“其他”
+        self.start_job(count_fields_job, self.data, selected_fields, on_partial=self.draw_field)
+
+    def draw_field(self, result):
+        row, field, labels, counts = result
+        with metrics.UI_REFRESH_SECONDS.time():
+            plot = self.chart_widget.addPlot(row=row, col=0)
+            draw_bar_chart(plot, labels, counts, f'{field}的分析结果')
 
     def perform_attack_detection(self):
-        if not self.file_path:
+        if not self.file_path or self.flow_features is None:
             QMessageBox.warning(self, "错误", "请选择数据文件")
             return
 
         self.source_ip = self.source_ip_input.text()  # 从输入框中获取源IP地址
-        
+        if not len(self.flow_features) and not self.source_ip:
+            self.result_text_edit.setText("没有可检测的数据包")
+            return
 
-        features_array = extract_features_from_pcap(self.file_path, self.source_ip)
-        features_array = np.array(features_array).reshape(1, -1)
-    
-        # 使用MinMaxScaler进行归一化
-        scaler = MinMaxScaler()
-        normalized_features = scaler.fit_transform(features_array)
-
-          # 返回归一化的特征作为列表
-        normalized_features = normalized_features[0].tolist()
-  
-    
-        
-        feature_names = ['Bwd_Packet_Length_Min','Subflow_Fwd_Bytes','Total_Length_of_Fwd_Packets','Fwd_Packet_Length_Mean','Bwd_Packet_Length_Std','Flow_Duration','Flow_IAT_Std','Init_Win_bytes_forward','Bwd_Packets/s',
-                 'PSH_Flag_Count','Average_Packet_Size']
-        # 将特征转换为字典
-        features_dict = {name: np.array([value]) for name, value in zip(feature_names, normalized_features)}
-
-        # 加载保存的模型
-        reconstructed_model = tf.keras.models.load_model('Final_Model')
-
-        # 进行推断
-        inference_ds = tf.data.Dataset.from_tensor_slices(features_dict).batch(1)
-        predictions = reconstructed_model.predict(inference_ds)
-
-        # 输出预测结果
-        class_names = ['Class1', 'Class2', 'Class3', 'Class4']
-        result = ""
-        for prediction in predictions:
-            predicted_class = class_names[prediction.argmax()]
-            if predicted_class == 'Class1':
-                result += '未受到攻击\n'
-            else:
-                result += '受到攻击\n'
-
-        # 显示检测结果
-        self.result_text_edit.setText(result)
+        # 复用打开文件时提取的流特征和已缓存的主机报告，避免重复解析；检测结果随每批推断完成逐步显示
+        mode = REPORT_MODES[self.report_mode_combo.currentIndex()][1]
+        host_report = self.host_reports.get(self.report_key(mode))
+        self.result_text_edit.clear()
+        self.start_job(detect_job, self.file_path, self.packets, self.source_ip, mode, host_report,
+                       self.flow_tuples, self.flow_features, self.cache, self.cache_key,
+                       on_partial=self.show_detection, on_finished=self.detection_finished)
+
+    def report_key(self, mode):
+        return self.file_path, os.path.getmtime(self.file_path), mode
+
+    def show_detection(self, result):
+        with metrics.UI_REFRESH_SECONDS.time():
+            self._show_detection(result)
+
+    def _show_detection(self, result):
+        # 输出预测结果，Class1表示未受到攻击
+        kind, value = result
+        if kind == 'hosts':
+            self.host_reports[self.report_key(value.mode)] = value
+            if self.host_model.report is not value:
+                self.host_model.set_report(value)
+                self.host_table.horizontalHeader().setSortIndicator(2, Qt.DescendingOrder)
+        elif kind == 'source':
+            if not value:
+                self.result_text_edit.append(f"源IP {self.source_ip}: 未在捕获中出现")
+            for host, class_name, probability in value:
+                verdict = '未受到攻击' if class_name == CLASS_NAMES[0] else '受到攻击'
+                self.result_text_edit.append(f"源IP {host}: {verdict} {class_name} ({probability:.2f})")
+            rows = self.host_model.report.lookup(self.source_ip)
+            table_row = self.host_model.row_of(rows[0]) if rows else None
+            if table_row is not None:
+                self.host_table.selectRow(table_row)
+        elif value:
+            self.result_text_edit.append("\n".join(
+                f"{src}:{sport} -> {dst}:{dport} {proto} {class_name}"
+                for (src, sport, dst, dport, proto), class_name in value))
+
+    def detection_finished(self, result):
+        _, total, attacked = result
+        self.result_text_edit.append(f"共{total}条流，其中{attacked}条受到攻击")
@@ -0,0 +1,75 @@
+import threading
+import traceback
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+import metrics
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    # 信号对象在界面线程创建，工作线程发出的信号排队到界面线程的事件循环中执行
+    progress = Signal(int, str)  # 进度百分比, 说明
+    partial = Signal(object)  # 增量结果
+    finished = Signal(object)  # 最终结果
+    failed = Signal(str)  # 错误信息
+    cancelled = Signal()
+
+
+class BackgroundJob(QRunnable):
+    # 在QThreadPool中执行耗时任务：fn(job, *args, **kwargs)通过job报告进度、发送增量结果并检查是否被取消
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self.setAutoDelete(False)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self._done_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, done, total, message=''):
+        # 同时作为取消点，任务在报告进度时检查是否被取消
+        self.check_cancelled()
+        self.signals.progress.emit(int(done * 100 / total) if total else 0, message)
+
+    def emit_partial(self, result):
+        self.check_cancelled()
+        self.signals.partial.emit(result)
+
+    def start(self, pool=None):
+        (pool or QThreadPool.globalInstance()).start(self)
+        return self
+
+    def run(self):
+        try:
+            # 性能分析开启时同时统计线程池中的任务
+            with metrics.profile_thread():
+                result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(f'{type(e).__name__}: {e}')
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            self._done_event.set()
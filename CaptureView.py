@@ -1,11 +1,35 @@
-import threading
-import pyshark
-import shutil
+import os
+import time
+from functools import partial
 from pyshark.tshark import tshark
-from PySide6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QTextEdit, QComboBox, QFileDialog, QMessageBox
-from PySide6.QtCore import Qt, QTimer
-from datetime import datetime
-from PySide6.QtGui import QColor
+from PySide6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QTableView, QHeaderView, QTextEdit, QComboBox, QFileDialog, QMessageBox, QSpinBox
+from PySide6.QtCore import QTimer, QThreadPool
+from live_capture import LiveCapture, PacketRing
+from rolling_pcap import RollingPcapWriter
+from pcap_reader import dissect_packet
+import display_filter
+import metrics
+from online_detector import OnlineDetector
+from BackgroundJob import BackgroundJob
+from PacketTableModel import PacketTableModel
+
+
+CAPTURE_DIR = 'captures'  # 每次捕获写入以开始时间命名的子目录，按大小或时间滚动为多个分段
+CAPTURE_SEGMENTS = 32  # 每次捕获保留的分段数上限（约2GB），超过时删除最旧的分段
+SAVE_WINDOWS = [('全部', None), ('最近1分钟', 60), ('最近5分钟', 300), ('最近30分钟', 1800)]
+HEADER_SNAPLEN = 128  # 只捕获包头时的截断长度，足够包含以太网、IP和TCP头部
+DETECT_TICK_SECONDS = metrics.histogram('sniff_detect_tick_seconds', '实时检测每次累加流表并打分的耗时（秒）')
+RING_SIZE = metrics.gauge('sniff_capture_ring_packets', '环形缓冲区中保留的数据包数')
+
+
+def detect_job(job, detector, packets, now, flush=False):
+    # 在检测线程中累加新到达的数据包并对已结束或超时的流批量打分（首次调用时加载模型），返回告警列表
+    with DETECT_TICK_SECONDS.time():
+        detector.update(packet for _, packet in packets)
+        alerts = detector.tick(now)
+    if flush:
+        alerts += detector.flush()
+    return alerts
 
 
 class CaptureView(QMainWindow):
@@ -23,16 +47,52 @@ class CaptureView(QMainWindow):
         for interface in available_interfaces:
             self.interface_combo.addItem(interface)
 
-        # 创建捕获数据显示表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)  # 设置列数为6
-        self.table.setHorizontalHeaderLabels(["捕获时间", "源地址", "目的地址", "协议类型", "数据大小", "数据内容"])
-        self.table.itemClicked.connect(self.show_packet_data)
+        self.capture = None  # 连续抓包实例
+        self.writer = None  # 分段写入的原始数据包
+        self.ring = PacketRing(capacity=100000)  # 捕获的数据包记录，固定容量的环形缓冲区
+        self.read_seq = 0  # 界面已读取到的序号
+        self.filter_text = ""  # 当前生效的过滤条件
+        self.packet_index = None  # 过滤用的列式索引，随表格刷新增量追加，整个捕获过程复用
+        self.detector = OnlineDetector()  # 实时攻击检测，每次捕获新建
+        self.detect_seq = 0  # 检测已处理到的序号
+        self.detect_jobs = []  # 未完成的检测任务，保留引用直到执行结束
+        # 检测任务（模型加载和推理）在单线程的线程池中依次执行，不阻塞界面
+        self.detect_pool = QThreadPool()
+        self.detect_pool.setMaxThreadCount(1)
+
+        # 创建捕获过滤器（BPF语法，在内核中过滤）、截断长度和内核缓冲区大小设置
+        self.bpf_input = QLineEdit()
+        self.bpf_input.setPlaceholderText("例如 tcp and not port 22")
+        self.snaplen_combo = QComboBox()
+        self.snaplen_combo.addItem("完整数据包", 0)
+        self.snaplen_combo.addItem(f"只捕获包头（{HEADER_SNAPLEN}字节）", HEADER_SNAPLEN)
+        self.buffer_spin = QSpinBox()
+        self.buffer_spin.setRange(0, 4096)
+        self.buffer_spin.setSuffix(" MB")
+        self.buffer_spin.setSpecialValueText("默认")
+
+        # 创建抓包统计显示，内核丢包时以红色提示
+        self.stats_label = QLabel()
+
+        # 创建捕获数据显示表格，使用虚拟化模型只渲染可见行
+        self.table_model = PacketTableModel(self.ring)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().resizeSection(0, 180)
+        self.table.verticalHeader().setDefaultSectionSize(24)
+        self.table.clicked.connect(self.show_packet_data)
 
         # 创建数据内容详细显示文本框
         self.data_text = QTextEdit()
         self.data_text.setReadOnly(True)
 
+        # 创建检测告警显示文本框
+        self.alert_text = QTextEdit()
+        self.alert_text.setReadOnly(True)
+        self.alert_text.setMaximumHeight(120)
+
         # 创建过滤器输入框和按钮
         self.filter_input = QLineEdit()
         self.filter_button = QPushButton("过滤")
@@ -45,7 +105,10 @@ class CaptureView(QMainWindow):
         self.stop_button.setEnabled(False)
         self.stop_button.clicked.connect(self.stop_capture_thread)
 
-        # 创建保存数据按钮
+        # 创建保存数据按钮和保存的时间范围
+        self.save_window_combo = QComboBox()
+        for label, _ in SAVE_WINDOWS:
+            self.save_window_combo.addItem(label)
         self.save_button = QPushButton("保存数据")
         self.save_button.clicked.connect(self.save_data)
 
@@ -53,29 +116,44 @@ class CaptureView(QMainWindow):
         layout = QVBoxLayout()
         filter_layout = QHBoxLayout()
         capture_layout = QHBoxLayout()
+        save_layout = QHBoxLayout()
         layout.addWidget(QLabel("网卡选择"))
         layout.addWidget(self.interface_combo)
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("捕获过滤器"))
+        options_layout.addWidget(self.bpf_input)
+        options_layout.addWidget(QLabel("截断长度"))
+        options_layout.addWidget(self.snaplen_combo)
+        options_layout.addWidget(QLabel("内核缓冲区"))
+        options_layout.addWidget(self.buffer_spin)
+        layout.addLayout(options_layout)
         layout.addWidget(QLabel("捕获数据"))
         layout.addWidget(self.table)
         layout.addWidget(QLabel("数据内容"))
         layout.addWidget(self.data_text)
+        layout.addWidget(QLabel("检测告警"))
+        layout.addWidget(self.alert_text)
         filter_layout.addWidget(QLabel("过滤器"))
         filter_layout.addWidget(self.filter_input)
         filter_layout.addWidget(self.filter_button)
         layout.addLayout(filter_layout)
         capture_layout.addWidget(self.start_button)
         capture_layout.addWidget(self.stop_button)
+        capture_layout.addWidget(self.stats_label)
         layout.addLayout(capture_layout)
-        layout.addWidget(self.save_button)
+        save_layout.addWidget(QLabel("保存范围"))
+        save_layout.addWidget(self.save_window_combo)
+        save_layout.addWidget(self.save_button)
+        layout.addLayout(save_layout)
 
         # 创建主部件并设置布局
         widget = QWidget()
         widget.setLayout(layout)
         self.setCentralWidget(widget)
 
-        self.capture_thread = None  # 捕包线程
-        self.capture = None  # PyShark抓包实例
-        self.captured_packets = []  # 捕获的数据包列表
+        # 捕包过程中定时增量刷新表格
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.refresh_table)
 
         # 添加定时器，每秒检查异常流量
         self.timer = QTimer()
@@ -83,8 +161,8 @@ class CaptureView(QMainWindow):
 
     def filter_data(self):
         # 根据过滤器条件筛选数据并更新表格显示
-        filter_text = self.filter_input.text()
-        filtered_packets = self.filter_packets(filter_text)
+        self.filter_text = self.filter_input.text()
+        filtered_packets = self.filter_packets(self.filter_text)
         self.update_table_data(filtered_packets)
 
     def start_capture_thread(self):
@@ -95,11 +173,29 @@ class CaptureView(QMainWindow):
         # 获取选择的网卡
         selected_interface = self.interface_combo.currentText()
 
-        # 创建并启动捕包线程
-        self.capture_thread = threading.Thread(target=self.capture_packets, args=(selected_interface,))
-        self.capture_thread.start()
+        # 清空上一次捕获的数据
+        self.ring.clear()
+        self.read_seq = 0
+        self.packet_index = None
+        self.update_table_data([])
+        self.detector = OnlineDetector()  # 上一次捕获的检测任务可能仍在执行，不复用同一个检测器
+        self.detect_seq = 0
+        self.alert_text.clear()
+
+        # 创建并启动连续捕包，原始数据包滚动写入新的捕获目录，不覆盖之前的捕获
+        directory = os.path.join(CAPTURE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+        self.writer = RollingPcapWriter(directory, max_segments=CAPTURE_SEGMENTS)
+        self.capture = LiveCapture(
+            selected_interface, self.ring, writer=self.writer,
+            bpf_filter=self.bpf_input.text().strip(),
+            snaplen=self.snaplen_combo.currentData(),
+            buffer_mb=self.buffer_spin.value(),
+        )
+        self.capture.start()
+        self.stats_label.clear()
 
         # 启动定时器
+        self.refresh_timer.start(500)
         self.timer.start(1000)
 
     def stop_capture_thread(self):
@@ -107,62 +203,64 @@ class CaptureView(QMainWindow):
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
 
-        # 停止捕包线程
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join()
+        # 结束抓包进程并等待捕包线程退出
+        if self.capture is not None:
+            self.capture.stop()
 
-        # 停止定时器
+        # 停止定时器，读取剩余的数据包并对剩余的流进行检测
+        self.refresh_timer.stop()
         self.timer.stop()
-
-    def capture_packets(self, interface):
-        # 捕获数据包的线程函数
-        self.capture = pyshark.LiveCapture(interface=interface,output_file="test.pcap")
-        self.capture.sniff(timeout=10)
-        self.capture.close()  # 确保捕获会话已关闭
-        self.captured_packets = self.capture._packets
-        self.update_table_data(self.captured_packets)
-
+        self.refresh_table()
+        self.check_abnormal_traffic(flush=True)
+        if self.capture is not None and self.capture.error is not None:
+            QMessageBox.warning(self, "捕获失败", str(self.capture.error))
+
+    def closeEvent(self, event):
+        # 关闭窗口时停止捕获，避免抓包线程和分段写入在没有界面的情况下继续运行
+        if self.capture is not None and self.capture.running:
+            self.stop_capture_thread()
+        super().closeEvent(event)
+
+    def show_capture_stats(self):
+        stats = self.capture.stats if self.capture is not None else None
+        if stats is None:
+            return
+        self.stats_label.setText(
+            f"已接收 {stats.received}  内核丢弃 {stats.dropped}  网卡丢弃 {stats.if_dropped}"
+        )
+        lost = stats.dropped or stats.if_dropped
+        self.stats_label.setStyleSheet("color: red" if lost else "")
+
+    def refresh_table(self):
+        # 增量读取环形缓冲区中新到达的数据包并追加到表格
+        with metrics.UI_REFRESH_SECONDS.time():
+            packets, self.read_seq = self.ring.read_since(self.read_seq)
+            if self.packet_index is not None:
+                self.packet_index.extend(packets)
+            if self.filter_text:
+                packets = self.filter_packets(self.filter_text, packets)
+            self.table_model.append(packets)
+            self.show_capture_stats()
+        RING_SIZE.set(len(self.ring))
+        if self.refresh_timer.isActive() and self.capture.error is not None and not self.capture.running:
+            # 捕获线程因错误退出（如过滤器语法错误、权限不足），恢复按钮状态并提示原因
+            self.stop_capture_thread()
 
     def update_table_data(self, packets):
-        self.table.setRowCount(len(packets))
-
-        for row, packet in enumerate(packets):
-            capture_time = QTableWidgetItem(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            source_address_item = QTableWidgetItem(packet.layers[1].src)
-            destination_address_item = QTableWidgetItem(packet.ip.dst)
-            protocol_item = QTableWidgetItem(self.get_protocol_type(packet))
-            total_length_item = QTableWidgetItem(str(packet.length))
-            data_content_item = QTableWidgetItem("点击查看")
-            data_content_item.setData(Qt.UserRole, str(packet))
-
-            self.table.setItem(row, 0, capture_time)
-            self.table.setItem(row, 1, source_address_item)
-            self.table.setItem(row, 2, destination_address_item)
-            self.table.setItem(row, 3, protocol_item)
-            self.table.setItem(row, 4, total_length_item)
-            self.table.setItem(row, 5, data_content_item)
-            # 根据协议类型设置行背景颜色
-            if protocol_item.text() == "TCP":
-                protocol_item.setBackground(QColor(255, 255, 0))
-            elif protocol_item.text() == "UDP":
-                protocol_item.setBackground(QColor(0, 255, 0))
-            else:
-                protocol_item.setBackground(QColor(255, 0, 0))
-
-        self.table.resizeColumnsToContents()
-        self.table.resizeRowsToContents()
-
-    def get_protocol_type(self, packet):
-        if hasattr(packet, 'transport_layer'):
-            if packet.transport_layer == 'TCP':
-                return 'TCP'
-            elif packet.transport_layer == 'UDP':
-                return 'UDP'
-        return 'Unknown'
-
-    def show_packet_data(self, item):
-        # 显示数据包的详细内容
-        packet_data = item.data(Qt.UserRole)
+        # packets为[(序号, 记录)]列表
+        self.table_model.set_rows(packets)
+
+    def show_packet_data(self, index):
+        # 点击时才解析该数据包的完整内容，按分段索引找到所在的分段文件和帧号
+        seq = self.table_model.seq(index.row())
+        packet = self.ring.get(seq)
+        packet_data = ""
+        if self.writer is not None and not self.capture.running:
+            location = self.writer.locate(seq)
+            if location is not None:
+                packet_data = dissect_packet(*location)
+        if not packet_data and packet is not None:
+            packet_data = str(packet)
         self.data_text.clear()
         self.data_text.insertPlainText(packet_data)
 
@@ -170,33 +268,63 @@ class CaptureView(QMainWindow):
 
     def save_data(self):
         # 获取保存文件的路径
+        if self.writer is None or not self.writer.frames:
+            QMessageBox.information(self, "提示", "没有可保存的数据")
+            return
         file_path, _ = QFileDialog.getSaveFileName(self, "保存数据", "./", "PCAP Files (*.pcap)")
 
         if file_path:
-        # 将test.pcap文件复制到指定路径
-            shutil.copyfile("test.pcap", file_path)
-        QMessageBox.information(self, "成功", "数据保存成功！")
-
-
-
-    def filter_packets(self, filter_text):
-        filtered_packets = []
-
-        for packet in self.captured_packets:
-            if filter_text in str(packet):
-                filtered_packets.append(packet)
-
-        return filtered_packets
-
-
-    def check_abnormal_traffic(self):
-        # 检测异常流量
-        total_packets = len(self.captured_packets)
-
-        if total_packets > 1000:
-            # 处理大规模数据流量
-            self.process_large_traffic(total_packets)
-
-        if total_packets > 0:
-            # 对每个数据包进行攻击检测
-            self.detect_attacks()
+            # 按分段索引直接定位时间窗口内的数据并复制，捕获过程中也可保存
+            seconds = SAVE_WINDOWS[self.save_window_combo.currentIndex()][1]
+            start = None
+            if seconds is not None:
+                start = self.writer.last_timestamp() - seconds
+            packets = self.writer.export(file_path, start=start)
+            QMessageBox.information(self, "成功", f"数据保存成功！共{packets}个数据包")
+
+
+
+    def read_packets(self):
+        # 环形缓冲区中仍保留的、界面已读取的记录
+        first_seq = self.ring.first_seq
+        return self.ring.read_since(first_seq, limit=max(self.read_seq - first_seq, 0))[0]
+
+    def current_index(self):
+        # 复用过滤索引；环形缓冲区覆盖掉的旧记录累积到一个缓冲区容量时才按当前内容重建，
+        # 使索引大小不超过两倍容量，重建开销分摊到大量新记录上
+        index = self.packet_index
+        if index is None or (index.seqs and index.seqs[0] < self.ring.first_seq - self.ring.capacity):
+            index = self.packet_index = display_filter.PacketIndex(self.read_packets())
+        return index
+
+    def filter_packets(self, filter_text, packets=None):
+        # 支持ip.src/ip.dst/port/proto/length等条件的过滤表达式，无法解析时按子串搜索
+        # packets为刚读取的新记录（已追加到索引）时只返回其中匹配的部分，否则过滤缓冲区中的全部记录
+        if not filter_text:
+            return self.read_packets() if packets is None else packets
+        index = self.current_index()
+        if packets is None:
+            start = index.row_of_seq(self.ring.first_seq)
+        else:
+            start = index.row_of_seq(packets[0][0]) if packets else len(index)
+        return display_filter.filter_packets(index, filter_text, start)
+
+
+    def check_abnormal_traffic(self, flush=False):
+        # 只把上次检测之后新到达的数据包交给检测任务累加到流表，不重新扫描已处理的数据
+        # 上一次检测尚未完成时跳过本次，新数据包留到下次；停止捕获时（flush）总是排队执行，对剩余的流打分
+        self.detect_jobs = [job for job in self.detect_jobs if not job.done]
+        if not flush and self.detect_jobs:
+            return
+        packets, self.detect_seq = self.ring.read_since(self.detect_seq)
+        job = BackgroundJob(detect_job, self.detector, packets, time.time(), flush)
+        job.signals.finished.connect(partial(self.show_alerts, detector=self.detector))
+        job.signals.failed.connect(lambda message: self.alert_text.append(f"检测失败: {message}"))
+        self.detect_jobs.append(job.start(self.detect_pool))
+
+    def show_alerts(self, alerts, detector=None):
+        # 忽略之前捕获的检测器在重新开始捕获后才完成的结果
+        if detector is not None and detector is not self.detector:
+            return
+        for (src, sport, dst, dport, proto), class_name, probability in alerts:
+            self.alert_text.append(f"受到攻击 {src}:{sport} -> {dst}:{dport} {proto} {class_name} ({probability:.2f})")
@@ -0,0 +1,86 @@
+import numpy as np
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QColor
+
+from inference import CLASS_NAMES
+
+
+ATTACK_COLOR = QColor(255, 200, 200)
+
+
+class HostReportModel(QAbstractTableModel):
+    # 主机检测报告的表格模型：排序只重排行号数组，不复制报告数据
+    HEADERS = ["主机", "判定", "攻击概率"] + CLASS_NAMES + ["发送包数", "接收包数"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.report = None
+        self._order = np.zeros(0, dtype=np.int64)  # 每一行对应的报告行号
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = int(self._order[index.row()])
+        column = index.column()
+        report = self.report
+        if role == Qt.DisplayRole:
+            if column < 3:
+                host, class_name, probability = report.describe(row)
+                return (host, class_name, f"{probability:.4f}")[column]
+            if column < 3 + len(CLASS_NAMES):
+                return f"{report.probabilities[row, column - 3]:.4f}"
+            if column == 3 + len(CLASS_NAMES):
+                return str(report.sent[row])
+            return str(report.received[row])
+        if role == Qt.BackgroundRole and report.labels[row] != 0:
+            return ATTACK_COLOR
+        if role == Qt.UserRole:
+            return row
+        return None
+
+    def _sort_key(self, column):
+        report = self.report
+        if column == 0:
+            return np.array([str(key) for key in report.keys])
+        if column == 1:
+            return report.labels
+        if column == 2:
+            return report.attack_probability
+        if column < 3 + len(CLASS_NAMES):
+            return report.probabilities[:, column - 3]
+        if column == 3 + len(CLASS_NAMES):
+            return report.sent
+        return report.received
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.report is None or not len(self.report):
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._order = np.argsort(self._sort_key(column), kind='stable')
+        if order == Qt.DescendingOrder:
+            self._order = self._order[::-1]
+        self.layoutChanged.emit()
+
+    def set_report(self, report):
+        # 报告已按攻击概率从高到低排列
+        self.beginResetModel()
+        self.report = report
+        self._order = np.arange(len(report) if report is not None else 0)
+        self.endResetModel()
+
+    def row_of(self, report_row):
+        # 报告行号在当前排序下的表格行
+        hits = np.flatnonzero(self._order == report_row)
+        return int(hits[0]) if len(hits) else None
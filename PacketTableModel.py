@@ -0,0 +1,86 @@
+from bisect import bisect_left
+from datetime import datetime
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QColor
+
+
+# 协议类型列的背景颜色
+PROTOCOL_COLORS = {
+    "TCP": QColor(255, 255, 0),
+    "UDP": QColor(0, 255, 0),
+}
+UNKNOWN_COLOR = QColor(255, 0, 0)
+
+
+class PacketTableModel(QAbstractTableModel):
+    # 基于环形缓冲区的虚拟化表格模型：只保存行对应的序号，视图只为可见行取数据
+    HEADERS = ["捕获时间", "源地址", "目的地址", "协议类型", "数据大小", "数据内容"]
+
+    def __init__(self, ring, parent=None):
+        super().__init__(parent)
+        self.ring = ring
+        self._seqs = []  # 每一行对应的环形缓冲区序号
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._seqs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        seq = self._seqs[index.row()]
+        if role == Qt.UserRole:
+            return seq
+        packet = self.ring.get(seq)
+        if packet is None:
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return datetime.fromtimestamp(packet.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            if column == 1:
+                return packet.src
+            if column == 2:
+                return packet.dst
+            if column == 3:
+                return packet.proto or "Unknown"
+            if column == 4:
+                return str(packet.length)
+            return "点击查看"
+        if role == Qt.BackgroundRole and column == 3:
+            return PROTOCOL_COLORS.get(packet.proto, UNKNOWN_COLOR)
+        return None
+
+    def seq(self, row):
+        return self._seqs[row]
+
+    def append(self, packets):
+        # 增量追加[(序号, 记录)]，同时移除已被环形缓冲区覆盖的最早的行
+        self._drop_evicted()
+        if not packets:
+            return
+        start = len(self._seqs)
+        self.beginInsertRows(QModelIndex(), start, start + len(packets) - 1)
+        self._seqs.extend(seq for seq, _ in packets)
+        self.endInsertRows()
+
+    def set_rows(self, packets):
+        # 整体替换显示的行，用于过滤结果
+        self.beginResetModel()
+        self._seqs = [seq for seq, _ in packets]
+        self.endResetModel()
+
+    def _drop_evicted(self):
+        count = bisect_left(self._seqs, self.ring.first_seq)
+        if count:
+            self.beginRemoveRows(QModelIndex(), 0, count - 1)
+            del self._seqs[:count]
+            self.endRemoveRows()
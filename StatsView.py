@@ -0,0 +1,161 @@
+import time
+
+from PySide6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QTextEdit, QSpinBox, QFileDialog, QMessageBox
+from PySide6.QtCore import QTimer
+
+import metrics
+
+
+class StatsView(QMainWindow):
+    # 运行统计面板：每秒刷新所有指标，计数器显示每秒速率，直方图显示次数、均值和分位数
+    HEADERS = ["指标", "当前值", "每秒", "次数", "均值", "p50", "p99"]
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("运行统计")
+        self.resize(1000, 720)
+        self.server = None  # Prometheus文本格式的HTTP端点
+        self.profiler = metrics.Profiler()
+        self.last_values = {}  # 计数器上次刷新时的值，用于计算速率
+        self.last_time = None
+
+        # 创建指标表格
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        # 创建导出、HTTP端点和性能分析按钮
+        self.export_button = QPushButton("导出指标")
+        self.export_button.clicked.connect(self.export_metrics)
+        self.port_spin = QSpinBox()
+        self.port_spin.setRange(1024, 65535)
+        self.port_spin.setValue(metrics.DEFAULT_PORT)
+        self.serve_button = QPushButton("启动HTTP端点")
+        self.serve_button.clicked.connect(self.toggle_server)
+        self.profile_button = QPushButton("开始性能分析")
+        self.profile_button.clicked.connect(self.toggle_profiler)
+
+        # 创建性能分析报告显示文本框
+        self.profile_text = QTextEdit()
+        self.profile_text.setReadOnly(True)
+
+        # 创建布局并添加控件
+        layout = QVBoxLayout()
+        button_layout = QHBoxLayout()
+        layout.addWidget(self.table)
+        button_layout.addWidget(self.export_button)
+        button_layout.addWidget(QLabel("端口"))
+        button_layout.addWidget(self.port_spin)
+        button_layout.addWidget(self.serve_button)
+        button_layout.addWidget(self.profile_button)
+        layout.addLayout(button_layout)
+        layout.addWidget(QLabel("性能分析报告"))
+        layout.addWidget(self.profile_text)
+
+        # 创建主部件并设置布局
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+
+        # 每秒刷新指标
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        now = time.perf_counter()
+        elapsed = now - self.last_time if self.last_time is not None else None
+        self.last_time = now
+        rows = []
+        for metric in metrics.REGISTRY.collect():
+            if metric.kind == 'histogram':
+                count = metric.count
+                mean = metric.total / count if count else 0
+                rows.append([metric.name, '', '', str(count), format_value(metric.name, mean),
+                             format_value(metric.name, metric.quantile(0.5)),
+                             format_value(metric.name, metric.quantile(0.99))])
+                continue
+            rate = ''
+            if metric.kind == 'counter':
+                last = self.last_values.get(metric.name)
+                if elapsed and last is not None:
+                    rate = f'{(metric.value - last) / elapsed:.1f}'
+                self.last_values[metric.name] = metric.value
+            rows.append([metric.name, format_value(metric.name, metric.value), rate, '', '', '', ''])
+
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(value))
+                else:
+                    item.setText(value)
+            self.table.item(row, 0).setToolTip(metrics.REGISTRY.metrics[values[0]].help)
+
+    def export_metrics(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出指标", "./metrics.prom", "Prometheus Text (*.prom *.txt)")
+        if file_path:
+            metrics.write(file_path)
+            QMessageBox.information(self, "成功", "指标导出成功！")
+
+    def toggle_server(self):
+        if self.server is None:
+            try:
+                self.server = metrics.serve(self.port_spin.value())
+            except OSError as e:
+                QMessageBox.warning(self, "错误", f"无法启动HTTP端点: {e}")
+                return
+            self.serve_button.setText("停止HTTP端点")
+            self.port_spin.setEnabled(False)
+            self.setWindowTitle(f"运行统计 - http://127.0.0.1:{self.port_spin.value()}/metrics")
+        else:
+            self.stop_server()
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.serve_button.setText("启动HTTP端点")
+        self.port_spin.setEnabled(True)
+        self.setWindowTitle("运行统计")
+
+    def toggle_profiler(self):
+        if not self.profiler.running:
+            self.profiler.start()
+            self.profile_button.setText("停止性能分析")
+            self.profile_text.setPlainText("性能分析中……")
+            return
+        path, report = self.profiler.stop()
+        self.profile_button.setText("开始性能分析")
+        self.profile_text.setPlainText(f"结果已保存到{path}\n\n{report}")
+
+    def showEvent(self, event):
+        # 窗口关闭后再次打开时恢复刷新
+        if not self.timer.isActive():
+            self.timer.start(1000)
+            self.refresh()
+        super().showEvent(event)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.stop_server()
+        if self.profiler.running:
+            self.profiler.stop()
+        super().closeEvent(event)
+
+
+def format_value(name, value):
+    # 耗时以毫秒显示，字节以MB显示
+    if name.endswith('_seconds'):
+        return f'{value * 1000:.3f} ms'
+    if name.endswith('_bytes'):
+        return f'{value / 1024 / 1024:.1f} MB'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 性能基准：使用仓库自带的test.pcap（可按需回放扩充到指定包数）测量解析、流特征提取和推理的性能，结果写入JSON
+#   python benchmark.py --packets 1000000 --output benchmark_results.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块，峰值内存记为不可用
+    resource = None
+
+import dpkt
+import numpy as np
+
+from flow_features import FlowTable, feature_last
+from packet_store import PacketStore
+from pcap_reader import read_pcap
+from sharded_analysis import analyze_pcap
+
+
+def synthesize_pcap(source, output, packets, gap=1.0):
+    # 循环回放source中的数据包，每轮平移时间戳并偏移端口以产生新的流，直到达到指定包数
+    with open(source, 'rb') as f:
+        reader = dpkt.pcap.UniversalReader(f)
+        datalink = reader.datalink()
+        frames = [(float(ts), buf) for ts, buf in reader]
+    if not frames:
+        raise ValueError(f'{source}中没有数据包')
+    span = frames[-1][0] - frames[0][0] + gap
+    written = 0
+    with open(output, 'wb') as f:
+        writer = dpkt.pcap.Writer(f, snaplen=65535, linktype=datalink)
+        round_index = 0
+        while written < packets:
+            for ts, buf in frames:
+                if written >= packets:
+                    break
+                if round_index and datalink == dpkt.pcap.DLT_EN10MB:
+                    buf = _shift_ports(buf, round_index)
+                writer.writepkt(buf, ts + round_index * span)
+                written += 1
+            round_index += 1
+    return written
+
+
+def _shift_ports(buf, offset):
+    eth = dpkt.ethernet.Ethernet(buf)
+    transport = getattr(eth.data, 'data', None)
+    if isinstance(transport, (dpkt.tcp.TCP, dpkt.udp.UDP)):
+        transport.sport = (transport.sport + offset) % 65536
+        transport.dport = (transport.dport + offset) % 65536
+        return bytes(eth)
+    return buf
+
+
+def peak_rss_mb():
+    # 无法获取时返回None
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return usage / 1024 ** 2 if sys.platform == 'darwin' else usage / 1024
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {'p50_ms': round(float(np.percentile(samples, 50)), 4), 'p99_ms': round(float(np.percentile(samples, 99)), 4)}
+
+
+def bench_load(file_path):
+    start = time.perf_counter()
+    store = PacketStore()
+    store.extend(read_pcap(file_path))
+    elapsed = time.perf_counter() - start
+    return {'packets': len(store), 'seconds': round(elapsed, 4), 'packets_per_second': round(len(store) / elapsed, 1)}
+
+
+def bench_extract(file_path):
+    packets = list(read_pcap(file_path))
+    start = time.perf_counter()
+    table = FlowTable()
+    table.extend(packets)
+    tuples, matrix = table.feature_matrix()
+    elapsed = time.perf_counter() - start
+    return {
+        'packets': len(packets), 'flows': len(tuples), 'seconds': round(elapsed, 4),
+        'packets_per_second': round(len(packets) / elapsed, 1),
+        'flows_per_second': round(len(tuples) / elapsed, 1),
+    }, matrix
+
+
+def bench_sharded(file_path, workers):
+    start = time.perf_counter()
+    store, flows = analyze_pcap(file_path, workers=workers)
+    elapsed = time.perf_counter() - start
+    return {'workers': workers, 'packets': len(store), 'flows': len(flows), 'seconds': round(elapsed, 4),
+            'packets_per_second': round(len(store) / elapsed, 1)}
+
+
+def bench_inference(matrix, model_path, repeats, batch_size, backend=None):
+    from inference import DetectionModel
+
+    model = DetectionModel(model_path, batch_size=batch_size, backend=backend)
+    start = time.perf_counter()
+    model.warm_up()
+    load_seconds = time.perf_counter() - start
+
+    batch = np.resize(matrix, (batch_size, len(feature_last))) if len(matrix) else np.zeros((batch_size, len(feature_last)))
+    batched = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(batch)
+        batched.append(time.perf_counter() - start)
+    single = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.predict(batch[i % len(batch)][None, :])
+        single.append(time.perf_counter() - start)
+    return {
+        'backend': model.backend,
+        'load_seconds': round(load_seconds, 4),
+        'batch_size': batch_size,
+        'batched': dict(percentiles(batched), rows_per_second=round(batch_size / float(np.median(batched)), 1)),
+        'single_row': percentiles(single),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='解析、特征提取和推理的性能基准')
+    parser.add_argument('--source', default='test.pcap', help='用于回放的样本抓包文件')
+    parser.add_argument('--packets', type=int, default=0, help='回放扩充到的包数，0表示直接使用样本文件')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='分片解析的进程数')
+    parser.add_argument('--model', default='Final_Model', help='模型目录')
+    parser.add_argument('--batch-size', type=int, default=8192)
+    parser.add_argument('--backend', choices=['numpy', 'tf'], help='推理后端，默认有导出权重时使用NumPy')
+    parser.add_argument('--repeats', type=int, default=50, help='推理延迟的采样次数')
+    parser.add_argument('--skip-inference', action='store_true', help='不测量推理（未安装TensorFlow时）')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果JSON文件')
+    args = parser.parse_args(argv)
+
+    results = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    with tempfile.TemporaryDirectory() as temp:
+        file_path = args.source
+        if args.packets:
+            file_path = os.path.join(temp, 'synthetic.pcap')
+            start = time.perf_counter()
+            synthesize_pcap(args.source, file_path, args.packets)
+            results['synthesize_seconds'] = round(time.perf_counter() - start, 4)
+        results['file_bytes'] = os.path.getsize(file_path)
+
+        results['load'] = bench_load(file_path)
+        results['extract'], matrix = bench_extract(file_path)
+        results['sharded'] = bench_sharded(file_path, args.workers)
+        if not args.skip_inference:
+            results['inference'] = bench_inference(matrix, args.model, args.repeats, args.batch_size, args.backend)
+    peak = peak_rss_mb()
+    results['peak_rss_mb'] = None if peak is None else round(peak, 1)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from flow_features import EXTRACTOR_VERSION
+from packet_store import PacketStore
+
+
+CACHE_DIR = os.environ.get('SNIFF_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'sniff-system'))
+CACHE_MAX_BYTES = int(os.environ.get('SNIFF_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+SAMPLE_BYTES = 4 * 1024 * 1024  # 内容哈希只读取文件头、中、尾各一段
+
+META_FILE = 'meta.json'
+HOSTS_FILE = 'hosts-{mode}.npz'  # 主机检测报告的输入（与模型无关），首次检测时写入
+PACKET_COLUMNS = ('src', 'dst', 'proto', 'length', 'sport', 'dport')
+FLOW_COLUMNS = ('flow_src', 'flow_sport', 'flow_dst', 'flow_dport', 'flow_proto')
+
+
+def content_hash(file_path, size):
+    # 对文件头、中、尾采样计算哈希，避免为校验而完整读取大文件
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for offset in sorted({0, max(size // 2 - SAMPLE_BYTES // 2, 0), max(size - SAMPLE_BYTES, 0)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def cache_key(file_path):
+    # 缓存键：文件路径、大小、修改时间、内容哈希和特征提取版本
+    stat = os.stat(file_path)
+    identity = {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'content': content_hash(file_path, stat.st_size),
+        'version': EXTRACTOR_VERSION,
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+class CaptureCache:
+    # 解析结果的磁盘缓存：列式数据包表和每条流的特征矩阵保存为.npy，读取时使用内存映射
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, file_path, key=None):
+        # 命中时返回(PacketStore, 五元组列表, 特征矩阵)，否则返回None；key为已计算的cache_key
+        key = key or cache_key(file_path)
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') != EXTRACTOR_VERSION:
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            columns = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in PACKET_COLUMNS + FLOW_COLUMNS}
+            flow_features = np.load(os.path.join(entry, 'flow_features.npy'), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # 更新修改时间作为LRU的最近使用时间
+        os.utime(meta_path)
+        ips, protos = meta['ips'], meta['protos']
+        store = PacketStore.from_arrays(columns, ips, protos)
+        flow_tuples = [
+            (ips[src], None if sport < 0 else sport, ips[dst], None if dport < 0 else dport,
+             None if proto < 0 else protos[proto])
+            for src, sport, dst, dport, proto in zip(*(columns[name].tolist() for name in FLOW_COLUMNS))
+        ]
+        return store, flow_tuples, flow_features
+
+    def save(self, file_path, store, flow_tuples, flow_features, key=None):
+        key = key or cache_key(file_path)
+        os.makedirs(self.directory, exist_ok=True)
+        temp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            for name, values in store.arrays().items():
+                np.save(os.path.join(temp, name + '.npy'), values)
+            # 流的五元组按列编码保存，IP和协议复用数据包表的取值表
+            flows = {name: [] for name in FLOW_COLUMNS}
+            for src, sport, dst, dport, proto in flow_tuples:
+                flows['flow_src'].append(store.ip_code(src))
+                flows['flow_sport'].append(-1 if sport is None else sport)
+                flows['flow_dst'].append(store.ip_code(dst))
+                flows['flow_dport'].append(-1 if dport is None else dport)
+                flows['flow_proto'].append(-1 if proto is None else store.proto_code(proto))
+            for name, values in flows.items():
+                np.save(os.path.join(temp, name + '.npy'), np.array(values, dtype=np.int32))
+            np.save(os.path.join(temp, 'flow_features.npy'), np.asarray(flow_features, dtype=np.float64))
+            with open(os.path.join(temp, META_FILE), 'w') as f:
+                json.dump({
+                    'file': os.path.abspath(file_path),
+                    'version': EXTRACTOR_VERSION,
+                    'packets': len(store),
+                    'flows': len(flow_tuples),
+                    'ips': store.ips,
+                    'protos': store.protos,
+                }, f)
+            entry = self._entry(key)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(temp, entry)
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+        self.evict()
+
+    def load_hosts(self, key, mode):
+        # 返回host_report.host_features的结果(主机列表, 特征矩阵, 发送包数, 接收包数)，未缓存时返回None
+        try:
+            with np.load(os.path.join(self._entry(key), HOSTS_FILE.format(mode=mode))) as hosts:
+                keys = hosts['keys'].tolist()
+                features, sent, received = hosts['features'], hosts['sent'], hosts['received']
+        except (OSError, ValueError, KeyError):
+            return None
+        # 主机对模式的键为(源, 目的)元组
+        return [tuple(key) if isinstance(key, list) else key for key in keys], features, sent, received
+
+    def save_hosts(self, key, mode, hosts):
+        # 缓存项已被淘汰或未能写入时不保存
+        entry = self._entry(key)
+        if not os.path.exists(os.path.join(entry, META_FILE)):
+            return
+        keys, features, sent, received = hosts
+        temp = os.path.join(entry, f'.tmp-{os.getpid()}-{mode}.npz')
+        # 主机模式的键为IP字符串，主机对模式为(源, 目的)，分别保存为一维和二维字符串数组
+        np.savez(temp, keys=np.array(keys, dtype=str), features=features, sent=sent, received=received)
+        os.replace(temp, os.path.join(entry, HOSTS_FILE.format(mode=mode)))
+
+    def evict(self):
+        # 总大小超过上限时按最近使用时间淘汰最旧的缓存项
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            entry = self._entry(name)
+            meta_path = os.path.join(entry, META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            entries.append((os.path.getmtime(meta_path), size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
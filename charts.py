@@ -0,0 +1,35 @@
+import numpy as np
+
+
+TOP_N = 20  # 高基数字段（IP、端口）只显示出现次数最多的前N项
+OTHER_LABEL = '其他'
+MISSING_LABEL = '无'
+BAR_COLOR = '#4c78a8'
+
+
+def value_counts(series, top_n=TOP_N):
+    # 在pandas中完成计数，返回按次数降序排列的(标签列表, 次数数组)，超出top_n的部分合并为“其他”
+    import pandas as pd
+
+    counts = series.value_counts(dropna=False)
+    counts = counts[counts > 0]
+    labels = [MISSING_LABEL if pd.isna(value) else str(value) for value in counts.index]
+    values = counts.to_numpy(dtype=np.int64)
+    if len(values) > top_n:
+        labels = labels[:top_n] + [OTHER_LABEL]
+        values = np.append(values[:top_n], values[top_n:].sum())
+    return labels, values
+
+
+def draw_bar_chart(plot, labels, counts, title):
+    # 在pyqtgraph的PlotItem上绘制横向条形图，只使用聚合后的少量数据
+    import pyqtgraph as pg
+
+    positions = np.arange(len(labels))
+    plot.addItem(pg.BarGraphItem(x0=0, y=positions, height=0.6, width=counts, brush=BAR_COLOR))
+    plot.getAxis('left').setTicks([list(zip(positions.tolist(), labels))])
+    plot.invertY(True)
+    plot.setTitle(title)
+    plot.setLabel('bottom', 'Count')
+    plot.setMouseEnabled(x=False, y=False)
+    plot.showGrid(x=True, y=False)
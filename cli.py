@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 无界面的批量检测入口，不导入任何Qt模块，可用于服务器或定时任务：
+#   python cli.py captures/ other.pcap --format csv --output result.csv --jobs 8
+#   python cli.py capture.pcap --window 10 --step 1   # 按时间窗口输出每台主机的检测时间线
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import metrics
+from flow_features import FlowTable, feature_last
+from host_report import HOST, PAIR
+from pcap_reader import read_pcap
+from window_features import WindowedFeatureExtractor
+
+
+PCAP_SUFFIXES = ('.pcap', '.pcapng', '.cap')
+FLOW_FIELDS = ['file', 'src', 'sport', 'dst', 'dport', 'proto', 'label', 'attack', 'probability']
+WINDOW_FIELDS = ['file', 'window_start', 'host', 'label', 'attack', 'probability']
+
+
+def find_captures(paths):
+    # 展开目录，返回所有抓包文件路径
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith(PCAP_SUFFIXES))
+        else:
+            files.append(path)
+    return files
+
+
+def extract_file(file_path):
+    # 工作进程：单次读取文件并提取每条流的特征
+    start = time.perf_counter()
+    table = FlowTable()
+    packets = 0
+    for packet in read_pcap(file_path):
+        table.add(packet)
+        packets += 1
+    tuples, matrix = table.feature_matrix()
+    return file_path, packets, tuples, matrix, time.perf_counter() - start
+
+
+def extract_windows(file_path, window, step, mode):
+    # 工作进程：单次读取文件，增量计算每个时间窗口中每台主机的特征
+    start = time.perf_counter()
+    extractor = WindowedFeatureExtractor(window, step, mode)
+    packets = 0
+    keys, rows = [], []
+    for packet in read_pcap(file_path):
+        for window_start, key, features in extractor.add(packet):
+            keys.append((window_start, key if mode == HOST else f'{key[0]} -> {key[1]}'))
+            rows.append(features)
+        packets += 1
+    for window_start, key, features in extractor.flush():
+        keys.append((window_start, key if mode == HOST else f'{key[0]} -> {key[1]}'))
+        rows.append(features)
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_last))
+    return file_path, packets, keys, matrix, time.perf_counter() - start
+
+
+def extract_safely(extract, file_path):
+    # 工作进程：单个文件出错（不存在、无法解析等）只记录错误，不中断同一批中的其他文件
+    try:
+        return extract(file_path), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+class ResultWriter:
+    # 以JSONL或CSV格式流式输出每条流（或每个窗口中每台主机）的检测结果
+    def __init__(self, stream, output_format, with_features=False, windowed=False):
+        self.stream = stream
+        self.output_format = output_format
+        self.windowed = windowed
+        self.fields = (WINDOW_FIELDS if windowed else FLOW_FIELDS) + (feature_last if with_features else [])
+        self.with_features = with_features
+        self._csv = None
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=self.fields)
+            self._csv.writeheader()
+
+    def write(self, file_path, tuples, matrix, labels, probabilities, class_names, attacks_only=False):
+        for i, key in enumerate(tuples):
+            label = int(labels[i])
+            if attacks_only and label == 0:
+                continue
+            if self.windowed:
+                window_start, host = key
+                row = {'file': file_path, 'window_start': round(window_start, 6), 'host': host}
+            else:
+                src, sport, dst, dport, proto = key
+                row = {'file': file_path, 'src': src, 'sport': sport, 'dst': dst, 'dport': dport, 'proto': proto}
+            row.update({
+                'label': class_names[label], 'attack': label != 0,
+                'probability': round(float(probabilities[i, label]), 6),
+            })
+            if self.with_features:
+                row.update(zip(feature_last, matrix[i].tolist()))
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量提取流特征并进行攻击检测')
+    parser.add_argument('paths', nargs='+', help='pcap/pcapng文件或目录')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help='输出格式')
+    parser.add_argument('--output', help='输出文件，默认为标准输出')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='并行解析的进程数')
+    parser.add_argument('--model', default='Final_Model', help='模型目录')
+    parser.add_argument('--batch-size', type=int, default=8192, help='推理批大小')
+    parser.add_argument('--attacks-only', action='store_true', help='只输出判定为攻击的流')
+    parser.add_argument('--features', action='store_true', help='同时输出特征值')
+    parser.add_argument('--window', type=float, help='按时间窗口（秒）检测每台主机，而不是按流检测')
+    parser.add_argument('--step', type=float, help='窗口步长（秒），默认等于窗口长度（滚动窗口）')
+    parser.add_argument('--host-mode', choices=[HOST, PAIR], default=HOST, help='窗口模式下按主机或有向主机对统计')
+    parser.add_argument('--metrics', help='结束时将运行指标以Prometheus文本格式写入该文件')
+    args = parser.parse_args(argv)
+
+    files = find_captures(args.paths)
+    if not files:
+        parser.error('没有找到抓包文件')
+    if args.window is not None:
+        step = args.window if args.step is None else args.step
+        if args.window <= 0 or step <= 0:
+            parser.error('窗口长度和步长必须大于0')
+        extract = partial(extract_windows, window=args.window, step=step, mode=args.host_mode)
+    else:
+        extract = extract_file
+
+    # 只在主进程加载一次模型
+    from inference import DetectionModel, CLASS_NAMES
+
+    model = DetectionModel(args.model, batch_size=args.batch_size)
+    model.load()
+
+    stream = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = ResultWriter(stream, args.format, with_features=args.features, windowed=args.window is not None)
+    started = time.perf_counter()
+    total_packets = total_flows = total_attacks = 0
+    failed = 0
+    latencies = []
+    try:
+        # 主进程已加载模型（可能已初始化TensorFlow的线程），使用spawn启动工作进程，与sharded_analysis一致
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max(args.jobs, 1), mp_context=context) as executor:
+            for file_path, (result, error) in zip(files, executor.map(partial(extract_safely, extract), files)):
+                if error is not None:
+                    failed += 1
+                    print(json.dumps({'file': file_path, 'error': error}, ensure_ascii=False), file=sys.stderr)
+                    continue
+                file_path, packets, tuples, matrix, parse_time = result
+                begin = time.perf_counter()
+                labels, probabilities = model.classify(matrix)
+                infer_time = time.perf_counter() - begin
+                latencies.append(infer_time)
+                writer.write(file_path, tuples, matrix, labels, probabilities, CLASS_NAMES, args.attacks_only)
+
+                attacks = int((labels != 0).sum())
+                total_packets += packets
+                total_flows += len(tuples)
+                total_attacks += attacks
+                print(json.dumps({
+                    'file': file_path, 'packets': packets, 'flows': len(tuples), 'attacks': attacks,
+                    'parse_seconds': round(parse_time, 4), 'infer_seconds': round(infer_time, 4),
+                }, ensure_ascii=False), file=sys.stderr)
+    finally:
+        if args.output:
+            stream.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'files': len(files), 'failed': failed, 'packets': total_packets, 'flows': total_flows, 'attacks': total_attacks,
+        'seconds': round(elapsed, 4),
+        'packets_per_second': round(total_packets / elapsed, 1) if elapsed else 0,
+        'flows_per_second': round(total_flows / elapsed, 1) if elapsed else 0,
+        'infer_p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'infer_p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }), file=sys.stderr)
+    if args.metrics:
+        # 解析在工作进程中进行，主进程的指标包含推断、内存等
+        metrics.write(args.metrics)
+    # 有文件处理失败时返回非零退出码，其余文件的结果照常输出
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
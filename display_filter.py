@@ -0,0 +1,282 @@
+import bisect
+import re
+
+import numpy as np
+
+from packet_store import PacketStore
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+# 过滤语言：字段 运算符 值，使用and/or/not（或&&/||/!）及括号组合，例如
+#   ip.src == 192.168.1.1 and not port == 53
+#   proto == tcp && length >= 100 && length <= 1500
+#   ip.addr == 10.0.0.1 or length == 60-128
+IP_FIELDS = {'ip.src': ('src',), 'ip.dst': ('dst',), 'ip.addr': ('src', 'dst')}
+PORT_FIELDS = {'sport': ('sport',), 'src.port': ('sport',), 'dport': ('dport',), 'dst.port': ('dport',),
+               'port': ('sport', 'dport')}
+LENGTH_FIELDS = ('length', 'len', 'frame.len')
+PROTO_FIELDS = ('proto', 'protocol')
+OPERATORS = ('==', '!=', '>=', '<=', '>', '<')
+REINDEX_ROWS = 4096  # 索引之后新追加的行数超过该值（且超过已索引行数的1/4）时重建索引，否则对新行顺序扫描
+
+_TOKEN = re.compile(r'\s*(==|!=|>=|<=|&&|\|\||[()<>!]|[^\s()<>!=&|]+)')
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise FilterSyntaxError(f'无法识别的字符: {text[position:]}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # 递归下降解析，生成嵌套元组形式的语法树
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position].lower() if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError('过滤条件为空')
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise FilterSyntaxError(f'多余的内容: {self.peek()}')
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() in ('or', '||'):
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() in ('and', '&&'):
+            self.take()
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() in ('not', '!'):
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            raise FilterSyntaxError('过滤条件不完整')
+        if token == '(':
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise FilterSyntaxError('缺少右括号')
+            self.take()
+            return node
+        field = self.take().lower()
+        # 单独的协议名，例如 tcp / udp
+        if field in ('tcp', 'udp') and self.peek() not in OPERATORS:
+            return ('cmp', 'proto', '==', field.upper())
+        if self.peek() not in OPERATORS:
+            raise FilterSyntaxError(f'字段{field}后缺少比较运算符')
+        op = self.take()
+        if self.peek() is None:
+            raise FilterSyntaxError(f'字段{field}缺少比较值')
+        return ('cmp', field, op, self.take())
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise FilterSyntaxError(f'无效的数值: {value}')
+
+
+def _compare(column, op, value):
+    if op == '==':
+        return column == value
+    if op == '!=':
+        return column != value
+    if op == '>':
+        return column > value
+    if op == '<':
+        return column < value
+    if op == '>=':
+        return column >= value
+    return column <= value
+
+
+class PacketIndex:
+    # 数据包的列式视图及二级索引（IP→行号、端口→行号），索引和文本索引都在首次使用时构建，
+    # 可以按序号顺序增量追加，已建立的索引继续复用
+    def __init__(self, packets=()):
+        # packets为按序号排列的[(序号, 记录)]列表
+        self.packets = []
+        self.seqs = []
+        self.store = PacketStore(capacity=max(len(packets), 1))
+        self.columns = self.store.arrays()
+        self._indexes = {}  # 列名→(取值→行号数组, 已建立索引的行数)
+        self._text = []
+        self.extend(packets)
+
+    def __len__(self):
+        return len(self.packets)
+
+    def extend(self, packets):
+        packets = list(packets)
+        if not packets:
+            return
+        self.packets.extend(packets)
+        self.seqs.extend(seq for seq, _ in packets)
+        self.store.extend(packet for _, packet in packets)
+        self.columns = self.store.arrays()
+
+    def row_of_seq(self, seq):
+        # 第一个序号不小于seq的行
+        return bisect.bisect_left(self.seqs, seq)
+
+    def rows(self, column, value):
+        # 通过排序分组建立取值→行号的索引，等值查询只需一次字典查找；索引之后追加的行顺序扫描
+        values = self.columns[column]
+        index, indexed = self._indexes.get(column, (None, 0))
+        if index is None or len(values) - indexed > max(REINDEX_ROWS, indexed // 4):
+            order = np.argsort(values, kind='stable')
+            keys, starts = np.unique(values[order], return_index=True)
+            bounds = np.append(starts, len(order))
+            index = {key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys.tolist())}
+            indexed = len(values)
+            self._indexes[column] = (index, indexed)
+        rows = index.get(value, np.empty(0, dtype=np.intp))
+        if indexed < len(values):
+            rows = np.concatenate([rows, np.flatnonzero(values[indexed:] == value) + indexed])
+        return rows
+
+    def text(self):
+        # 子串搜索使用的文本索引
+        if len(self._text) < len(self.packets):
+            self._text.extend(str(packet) for _, packet in self.packets[len(self._text):])
+        return self._text
+
+    def select(self, mask, start=0):
+        # 返回mask为真且行号不小于start的[(序号, 记录)]
+        return [self.packets[i] for i in np.flatnonzero(mask[start:]) + start]
+
+
+class DisplayFilter:
+    # 编译后的过滤条件，对列式数据做向量化求值
+    def __init__(self, text):
+        self.text = text
+        self.tree = _Parser(_tokenize(text)).parse()
+        self._validate(self.tree)
+
+    def _validate(self, node):
+        if node[0] in ('and', 'or'):
+            self._validate(node[1])
+            self._validate(node[2])
+        elif node[0] == 'not':
+            self._validate(node[1])
+        else:
+            _, field, op, value = node
+            if field in IP_FIELDS or field in PROTO_FIELDS:
+                if op not in ('==', '!='):
+                    raise FilterSyntaxError(f'{field}只支持==和!=')
+            elif field in PORT_FIELDS or field in LENGTH_FIELDS:
+                low, _, high = value.partition('-')
+                _parse_int(low)
+                if high:
+                    _parse_int(high)
+                    if op not in ('==', '!='):
+                        raise FilterSyntaxError('数值范围只支持==和!=')
+            else:
+                raise FilterSyntaxError(f'未知字段: {field}')
+
+    def __call__(self, index):
+        return self._evaluate(self.tree, index)
+
+    def _evaluate(self, node, index):
+        kind = node[0]
+        if kind == 'and':
+            return self._evaluate(node[1], index) & self._evaluate(node[2], index)
+        if kind == 'or':
+            return self._evaluate(node[1], index) | self._evaluate(node[2], index)
+        if kind == 'not':
+            return ~self._evaluate(node[1], index)
+        _, field, op, value = node
+        if field in IP_FIELDS:
+            code = index.store.ip_code(value)
+            mask = self._equals(index, IP_FIELDS[field], code)
+        elif field in PROTO_FIELDS:
+            code = index.store.proto_code(value.upper())
+            mask = self._equals(index, ('proto',), code)
+        else:
+            columns = PORT_FIELDS.get(field, ('length',))
+            is_port = field in PORT_FIELDS
+            low, _, high = value.partition('-')
+            if high:
+                mask = np.zeros(len(index), dtype=bool)
+                for column in columns:
+                    values = index.columns[column]
+                    mask |= (values >= _parse_int(low)) & (values <= _parse_int(high)) & (values >= 0 if is_port else True)
+            elif op in ('==', '!=') and is_port:
+                mask = self._equals(index, columns, _parse_int(low))
+            else:
+                mask = np.zeros(len(index), dtype=bool)
+                for column in columns:
+                    values = index.columns[column]
+                    mask |= _compare(values, op if op != '!=' else '==', _parse_int(low)) & (values >= 0 if is_port else True)
+            if op == '!=':
+                mask = ~mask
+                if is_port:
+                    # 没有端口的数据包（ICMP、ARP等，端口列为-1）不满足任何端口条件
+                    mask &= self._has_port(index, columns)
+            return mask
+        return ~mask if op == '!=' else mask
+
+    def _has_port(self, index, columns):
+        mask = np.zeros(len(index), dtype=bool)
+        for column in columns:
+            mask |= index.columns[column] >= 0
+        return mask
+
+    def _equals(self, index, columns, value):
+        # 等值条件直接查二级索引
+        mask = np.zeros(len(index), dtype=bool)
+        if value is None:
+            return mask
+        for column in columns:
+            mask[index.rows(column, value)] = True
+        return mask
+
+
+def compile_filter(text):
+    return DisplayFilter(text)
+
+
+def filter_packets(packets, text, start=0):
+    # 过滤[(序号, 记录)]或PacketIndex中行号不小于start的部分：能解析为过滤表达式时向量化求值，否则退回子串搜索
+    index = packets if isinstance(packets, PacketIndex) else PacketIndex(packets)
+    try:
+        mask = compile_filter(text)(index)
+    except FilterSyntaxError:
+        texts = index.text()
+        mask = np.zeros(len(index), dtype=bool)
+        mask[start:] = np.fromiter((text in row for row in texts[start:]), dtype=bool, count=len(index) - start)
+    return index.select(mask, start)
@@ -0,0 +1,200 @@
+import math
+import time
+
+import numpy as np
+
+import metrics
+from packet_record import FlowKey
+from pcap_reader import read_pcap, TH_PUSH
+
+
+# 模型使用的11个特征，顺序与model/train.py中的feature_last一致
+feature_last = ['Bwd_Packet_Length_Min','Subflow_Fwd_Bytes','Total_Length_of_Fwd_Packets','Fwd_Packet_Length_Mean','Bwd_Packet_Length_Std','Flow_Duration','Flow_IAT_Std','Init_Win_bytes_forward','Bwd_Packets/s',
+                 'PSH_Flag_Count','Average_Packet_Size']
+
+# 特征提取逻辑变化时递增，使磁盘缓存中的旧结果失效
+EXTRACTOR_VERSION = 1
+
+EXTRACT_SECONDS = metrics.histogram('sniff_extract_seconds', '每次由流表生成特征矩阵的耗时（秒）')
+EXTRACTED_FLOWS = metrics.counter('sniff_extracted_flows_total', '已生成特征向量的流数')
+
+
+class RunningStats:
+    # 单次遍历的统计量：计数、求和、平方和、最值。输入均为整数，
+    # 求和使用Python整数精确累加，分片结果按任意顺序合并都与顺序计算完全一致
+    __slots__ = ('count', 'total', 'squares', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.squares = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.squares += value * value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def remove(self, value):
+        # 扣除一个此前加入的值（滑动窗口用），计数与和精确扣除，最值不再维护
+        self.count -= 1
+        self.total -= value
+        self.squares -= value * value
+
+    def std(self):
+        # 总体标准差，与np.std一致
+        n = self.count
+        if not n:
+            return 0.0
+        return math.sqrt(max(n * self.squares - self.total * self.total, 0) / (n * n))
+
+
+def to_microseconds(timestamp):
+    return round(timestamp * 1e6)
+
+
+class FlowStats:
+    # 单条双向流的累加器，side为0/1分别对应五元组中排序较小/较大的一端，时间均为整数微秒
+    __slots__ = ('first_ts', 'last_ts', 'first_side', 'lengths', 'init_win', 'iat', 'psh_flags')
+
+    def __init__(self, side, timestamp):
+        self.first_ts = timestamp
+        self.last_ts = timestamp
+        self.first_side = side  # 流中第一个数据包的方向即为“向前”
+        self.lengths = (RunningStats(), RunningStats())  # 两个方向的载荷长度
+        self.init_win = [None, None]  # 两个方向的初始窗口大小
+        self.iat = RunningStats()  # 到达时间间隔
+        self.psh_flags = 0
+
+    def add(self, packet, side, timestamp):
+        if self.lengths[0].count or self.lengths[1].count:
+            self.iat.add(timestamp - self.last_ts)
+        self.last_ts = timestamp
+        self.lengths[side].add(packet.payload_len)
+        if self.init_win[side] is None and packet.window is not None:
+            self.init_win[side] = packet.window
+        if packet.flags & TH_PUSH:
+            self.psh_flags += 1
+
+    def merge(self, other):
+        # 合并同一条流在时间上位于其后的部分累加器
+        self.iat.merge(other.iat)
+        self.iat.add(other.first_ts - self.last_ts)
+        self.last_ts = other.last_ts
+        for side in (0, 1):
+            self.lengths[side].merge(other.lengths[side])
+            if self.init_win[side] is None:
+                self.init_win[side] = other.init_win[side]
+        self.psh_flags += other.psh_flags
+
+    def features(self):
+        # 生成CIC-IDS2017风格的特征向量，时间单位与数据集一致（微秒）
+        fwd = self.lengths[self.first_side]
+        bwd = self.lengths[1 - self.first_side]
+        duration = self.last_ts - self.first_ts
+        packets = fwd.count + bwd.count
+        init_win = self.init_win[self.first_side]
+        return [
+            bwd.min if bwd.count else 0,
+            fwd.total,
+            fwd.total,
+            fwd.total / fwd.count if fwd.count else 0,
+            bwd.std(),
+            duration,
+            self.iat.std(),
+            -1 if init_win is None else init_win,
+            bwd.count / (duration / 1e6) if duration > 0 else 0,
+            self.psh_flags,
+            (fwd.total + bwd.total) / packets if packets else 0,
+        ]
+
+
+class FlowTable:
+    # 按五元组分组的流表，内存只随活动流数量增长
+    def __init__(self):
+        self.flows = {}
+
+    def __len__(self):
+        return len(self.flows)
+
+    def add(self, packet):
+        key, side = FlowKey.of(packet)
+        timestamp = to_microseconds(packet.timestamp)
+        stats = self.flows.get(key)
+        if stats is None:
+            stats = self.flows[key] = FlowStats(side, timestamp)
+        stats.add(packet, side, timestamp)
+        return key
+
+    def extend(self, packets):
+        for packet in packets:
+            self.add(packet)
+
+    def expire(self, now, idle_timeout, active_timeout=None):
+        # 取出空闲超时（或持续时间超过active_timeout）的流，返回[(流键, 累加器)]，时间参数单位为秒
+        now = to_microseconds(now)
+        idle_timeout = to_microseconds(idle_timeout)
+        active_timeout = None if active_timeout is None else to_microseconds(active_timeout)
+        expired = [
+            key for key, stats in self.flows.items()
+            if now - stats.last_ts > idle_timeout
+            or (active_timeout is not None and now - stats.first_ts > active_timeout)
+        ]
+        return [(key, self.flows.pop(key)) for key in expired]
+
+    def merge(self, other):
+        # 按时间顺序合并后一个分片的流表，新出现的流保持首次出现的顺序
+        for key, stats in other.flows.items():
+            current = self.flows.get(key)
+            if current is None:
+                self.flows[key] = stats
+            else:
+                current.merge(stats)
+
+    def pop(self, keys):
+        return [(key, self.flows.pop(key)) for key in keys if key in self.flows]
+
+    def feature_matrix(self, flows=None):
+        # 一次性生成所有流的特征矩阵，返回(按“向前”方向排列的五元组列表, 矩阵)
+        if flows is None:
+            flows = self.flows.items()
+        start = time.perf_counter()
+        tuples = []
+        rows = []
+        for key, stats in flows:
+            tuples.append(flow_tuple(key, stats))
+            rows.append(stats.features())
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_last))
+        EXTRACT_SECONDS.observe(time.perf_counter() - start)
+        EXTRACTED_FLOWS.inc(len(tuples))
+        return tuples, matrix
+
+
+def flow_tuple(key, stats):
+    # 将流键还原为(源IP, 源端口, 目的IP, 目的端口, 协议)
+    return key.oriented(stats.first_side)
+
+
+def extract_flow_features(packets):
+    # 单次流式遍历数据包，返回每条流的五元组和特征矩阵
+    table = FlowTable()
+    table.extend(packets)
+    return table.feature_matrix()
+
+
+def extract_flow_features_from_pcap(file_path):
+    return extract_flow_features(read_pcap(file_path))
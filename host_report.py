@@ -0,0 +1,100 @@
+import numpy as np
+
+from flow_features import FlowStats, feature_last, to_microseconds
+from inference import CLASS_NAMES
+
+
+HOST, PAIR = 'host', 'pair'
+
+
+class HostTable:
+    # 单次遍历为每台主机（或每个有向主机对）累加特征：发送的TCP数据包为“向前”，接收的为“向后”
+    def __init__(self, mode=HOST):
+        self.mode = mode
+        self.hosts = {}
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def add(self, packet):
+        if packet.proto != 'TCP':
+            return
+        timestamp = to_microseconds(packet.timestamp)
+        if self.mode == PAIR:
+            sides = (((packet.src, packet.dst), 0), ((packet.dst, packet.src), 1))
+        else:
+            sides = ((packet.src, 0), (packet.dst, 1))
+        for key, side in sides:
+            stats = self.hosts.get(key)
+            if stats is None:
+                stats = self.hosts[key] = FlowStats(0, timestamp)
+            stats.add(packet, side, timestamp)
+
+    def extend(self, packets):
+        for packet in packets:
+            self.add(packet)
+
+    def feature_matrix(self):
+        keys = list(self.hosts)
+        rows = [self.hosts[key].features() for key in keys]
+        return keys, np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_last))
+
+
+class HostReport:
+    # 所有主机的检测结果，按受到攻击的概率从高到低排列
+    def __init__(self, mode, keys, features, probabilities, sent, received):
+        order = np.argsort(probabilities[:, 0], kind='stable')  # 正常类别概率从低到高
+        self.mode = mode
+        self.keys = [keys[i] for i in order]
+        self.features = features[order]
+        self.probabilities = probabilities[order]
+        self.labels = self.probabilities.argmax(axis=1) if len(keys) else np.zeros(0, dtype=np.int64)
+        self.sent = sent[order]
+        self.received = received[order]
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def attack_probability(self):
+        # 非Class1（正常）类别的概率之和
+        return 1 - self.probabilities[:, 0]
+
+    def row(self, key):
+        return self._rows.get(key)
+
+    def lookup(self, host):
+        # 返回与host相关的行号：主机模式为该主机，主机对模式为以其为源的所有主机对
+        if self.mode == HOST:
+            row = self._rows.get(host)
+            return [] if row is None else [row]
+        return [row for row, key in enumerate(self.keys) if key[0] == host]
+
+    def describe(self, row):
+        key = self.keys[row]
+        host = key if self.mode == HOST else f'{key[0]} -> {key[1]}'
+        return host, CLASS_NAMES[self.labels[row]], float(self.attack_probability[row])
+
+
+def host_features(packets, mode=HOST):
+    # 单次遍历数据包，返回(主机列表, 特征矩阵, 发送包数, 接收包数)；与模型无关，可以缓存
+    table = HostTable(mode)
+    table.extend(packets)
+    keys, features = table.feature_matrix()
+    sent = np.array([table.hosts[key].lengths[0].count for key in keys], dtype=np.int64)
+    received = np.array([table.hosts[key].lengths[1].count for key in keys], dtype=np.int64)
+    return keys, features, sent, received
+
+
+def classify_hosts(model, mode, keys, features, sent, received):
+    # 所有主机的特征向量一次批量推断
+    if keys:
+        _, probabilities = model.classify(features)
+    else:
+        probabilities = np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+    return HostReport(mode, keys, features, probabilities, sent, received)
+
+
+def build_host_report(packets, model, mode=HOST):
+    return classify_hosts(model, mode, *host_features(packets, mode))
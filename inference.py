@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+import metrics
+from flow_features import feature_last
+
+
+MODEL_PATH = 'Final_Model'
+SCALER_FILE = 'scaler.json'  # 由model/train.py在模型目录下生成
+WEIGHTS_FILE = 'weights.npz'  # 由model/export.py导出，存在时无需导入TensorFlow
+SAVED_MODEL_FILE = 'saved_model.pb'
+CLASS_NAMES = ['Class1', 'Class2', 'Class3', 'Class4']
+
+# DenseFeatures按特征列名排序后拼接输入，稠密矩阵需按此顺序重排
+DENSE_ORDER = [feature_last.index(name) for name in sorted(feature_last)]
+
+
+class Scaler:
+    # 训练集的标准化参数，对整批特征矩阵做向量化变换
+    def __init__(self, mean, std):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        self.std = np.where(std > 0, std, 1).astype(np.float32)  # 常数列不缩放
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            params = json.load(f)
+        # 按feature_last的顺序排列参数
+        index = [params['features'].index(name) for name in feature_last]
+        mean = np.asarray(params['mean'])[index]
+        std = np.asarray(params['std'])[index]
+        return cls(mean, std)
+
+    def transform(self, features):
+        return (features - self.mean) / self.std
+
+
+SELU_ALPHA = 1.6732632423543772
+SELU_SCALE = 1.0507009873554805
+
+
+def _selu(x):
+    return SELU_SCALE * np.where(x > 0, x, SELU_ALPHA * np.expm1(np.minimum(x, 0)))
+
+
+def _softmax(x):
+    x = np.exp(x - x.max(axis=1, keepdims=True))
+    return x / x.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'selu': _selu,
+    'softmax': _softmax,
+    'relu': lambda x: np.maximum(x, 0),
+    'linear': lambda x: x,
+}
+
+
+class NumpyNetwork:
+    # 纯NumPy的前向计算：依次执行导出的Dense层，输入为按feature_last排列的标准化矩阵
+    def __init__(self, kernels, biases, activations):
+        self.layers = [
+            (np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), ACTIVATIONS[activation])
+            for kernel, bias, activation in zip(kernels, biases, activations)
+        ]
+
+    @classmethod
+    def load(cls, path):
+        # 返回(网络, 标准化参数)
+        with np.load(path) as weights:
+            count = len(weights['activations'])
+            network = cls([weights[f'kernel_{i}'] for i in range(count)],
+                          [weights[f'bias_{i}'] for i in range(count)],
+                          [str(name) for name in weights['activations']])
+            scaler = Scaler(weights['mean'], weights['std'])
+        return network, scaler
+
+    def __call__(self, features):
+        x = features
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+
+def _weights_current(model_path):
+    # 导出文件不早于SavedModel时才使用，避免重新训练后仍使用旧权重
+    weights_path = os.path.join(model_path, WEIGHTS_FILE)
+    if not os.path.exists(weights_path):
+        return False
+    saved_model = os.path.join(model_path, SAVED_MODEL_FILE)
+    if os.path.exists(saved_model) and os.path.getmtime(saved_model) > os.path.getmtime(weights_path):
+        warnings.warn(f'{weights_path}早于SavedModel，请重新运行model/export.py，暂时使用TensorFlow推理')
+        return False
+    return True
+
+
+def _build_predict_fn(tf, model):
+    # 构建固定输入签名的计算图：直接把(N, 11)矩阵送入Dense层，跳过DenseFeatures的字典输入
+    spec = tf.TensorSpec([None, len(feature_last)], tf.float32)
+    if model.layers and type(model.layers[0]).__name__ == 'DenseFeatures':
+        order = tf.constant(DENSE_ORDER)
+        layers = model.layers[1:]
+
+        @tf.function(input_signature=[spec])
+        def predict(features):
+            x = tf.gather(features, order, axis=1)
+            for layer in layers:
+                x = layer(x)
+            return x
+    else:
+        @tf.function(input_signature=[spec])
+        def predict(features):
+            return model(features, training=False)
+    return predict.get_concrete_function()
+
+
+INFERENCE_SECONDS = metrics.histogram('sniff_inference_seconds', '每次推断调用的耗时（秒）')
+INFERENCE_ROWS = metrics.histogram('sniff_inference_batch_rows', '每次推断调用的特征行数', metrics.SIZE_BUCKETS)
+
+
+class DetectionModel:
+    # 推理服务：模型只加载一次并常驻内存，按大批量对特征矩阵进行分类
+    # backend为'numpy'时使用导出的权重，为'tf'时加载SavedModel，None时有导出权重则优先使用NumPy
+    def __init__(self, model_path=MODEL_PATH, batch_size=8192, backend=None):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.backend = backend
+        self._tf = None
+        self._model = None
+        self._predict_fn = None
+        self.scaler = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._predict_fn is not None
+
+    @property
+    def needs_tensorflow(self):
+        # 加载时是否会导入TensorFlow（没有与模型一致的导出权重时）
+        if self._predict_fn is not None:
+            return False
+        return self.backend == 'tf' or (self.backend != 'numpy' and not _weights_current(self.model_path))
+
+    def load(self):
+        # 懒加载，可在后台线程中提前调用
+        with self._lock:
+            if self._predict_fn is None and self.backend != 'tf' and (
+                    self.backend == 'numpy' or _weights_current(self.model_path)):
+                self._predict_fn, self.scaler = NumpyNetwork.load(os.path.join(self.model_path, WEIGHTS_FILE))
+                self.backend = 'numpy'
+            if self._predict_fn is None:
+                import tensorflow as tf
+
+                self._tf = tf
+                self._model = tf.keras.models.load_model(self.model_path)
+                self._predict_fn = _build_predict_fn(tf, self._model)
+                self.backend = 'tf'
+                scaler_path = os.path.join(self.model_path, SCALER_FILE)
+                if os.path.exists(scaler_path):
+                    self.scaler = Scaler.load(scaler_path)
+                else:
+                    warnings.warn(f'{scaler_path}不存在，特征将不做标准化直接推理')
+        return self._predict_fn
+
+    def warm_up(self):
+        self.predict(np.zeros((1, len(feature_last)), dtype=np.float32))
+
+    def predict(self, features):
+        # features为按feature_last排列的原始(N, 11)矩阵，返回(N, 4)的类别概率
+        features = np.asarray(features, dtype=np.float32).reshape(-1, len(feature_last))
+        if not len(features):
+            return np.empty((0, len(CLASS_NAMES)), dtype=np.float32)
+        predict_fn = self.load()
+        began = time.perf_counter()
+        if self.scaler is not None:
+            features = self.scaler.transform(features)
+        outputs = []
+        for start in range(0, len(features), self.batch_size):
+            batch = features[start:start + self.batch_size]
+            if self.backend == 'numpy':
+                outputs.append(predict_fn(batch))
+            else:
+                outputs.append(predict_fn(self._tf.convert_to_tensor(batch)).numpy())
+        INFERENCE_SECONDS.observe(time.perf_counter() - began)
+        INFERENCE_ROWS.observe(len(features))
+        return np.concatenate(outputs)
+
+    def classify(self, features):
+        # 返回预测类别下标和类别概率
+        probabilities = self.predict(features)
+        return probabilities.argmax(axis=1), probabilities
+
+
+_default_model = None
+_default_lock = threading.Lock()
+
+
+def get_model():
+    # 进程内共享的推理服务实例
+    global _default_model
+    with _default_lock:
+        if _default_model is None:
+            _default_model = DetectionModel()
+    return _default_model
@@ -0,0 +1,309 @@
+import ctypes
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import dpkt
+from pyshark.tshark import tshark
+
+import metrics
+from pcap_reader import PARSE_SECONDS, decode_packet
+
+try:
+    import libpcap as pcap
+except ImportError:
+    # 未安装libpcap包时使用dumpcap
+    pcap = None
+except OSError:
+    # 系统中找不到libpcap动态库（Linux/macOS未安装libpcap）时改用libpcap包自带的动态库，
+    # Windows下需要安装Npcap（与Wireshark相同），仍然失败时使用dumpcap
+    try:
+        sys.modules['libpcap.__config__'].config['LIBPCAP'] = 'tcpdump'
+        # 与libpcap.config()相同，清除导入失败时残留的子模块后重新导入
+        for name in [name for name in sys.modules if name.startswith('libpcap.') and name != 'libpcap.__config__']:
+            del sys.modules[name]
+        import libpcap as pcap
+    except (KeyError, ImportError, OSError, ValueError):
+        pcap = None
+
+
+DUMPCAP, LIBPCAP = 'dumpcap', 'libpcap'
+DEFAULT_SNAPLEN = 262144
+READ_TIMEOUT_MS = 100  # libpcap读超时，保证停止捕获时能及时退出
+STATS_INTERVAL = 1.0  # 内核丢包计数的刷新间隔（秒）
+DUMPCAP_STATS = re.compile(r"received/dropped on interface '.*?': (\d+)/(\d+)(?:.*?ps_ifdrop:(\d+))?")
+
+# 抓包统计：接收数、内核缓冲区满丢弃数(ps_drop)、网卡/驱动丢弃数(ps_ifdrop)
+CaptureStats = namedtuple('CaptureStats', ['received', 'dropped', 'if_dropped'])
+
+FLUSH_INTERVAL = 1024  # 每捕获多少帧更新一次计数器
+CAPTURE_PACKETS = metrics.counter('sniff_capture_packets_total', '实时捕获的帧数')
+CAPTURE_BYTES = metrics.counter('sniff_capture_bytes_total', '实时捕获的字节数（截断后）')
+KERNEL_RECEIVED = metrics.gauge('sniff_capture_kernel_received', '本次捕获内核收到的数据包数(ps_recv)')
+KERNEL_DROPPED = metrics.gauge('sniff_capture_kernel_dropped', '本次捕获内核缓冲区满丢弃的数据包数(ps_drop)')
+INTERFACE_DROPPED = metrics.gauge('sniff_capture_interface_dropped', '本次捕获网卡或驱动丢弃的数据包数(ps_ifdrop)')
+
+
+class CaptureError(Exception):
+    pass
+
+
+class PacketRing:
+    # 固定容量的环形缓冲区：捕包线程写入，界面按序号增量读取，内存占用恒定
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._next_seq = 0  # 下一个写入位置的序号，同时也是已捕获的帧总数
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._next_seq, self.capacity)
+
+    @property
+    def first_seq(self):
+        # 仍保留在缓冲区中的最早序号
+        return max(0, self._next_seq - self.capacity)
+
+    @property
+    def next_seq(self):
+        return self._next_seq
+
+    def push(self, record):
+        # 非IP帧写入None，保证序号与输出文件中的帧序号一致
+        with self._lock:
+            self._slots[self._next_seq % self.capacity] = record
+            self._next_seq += 1
+
+    def get(self, seq):
+        # 按序号读取，已被覆盖的记录返回None
+        with self._lock:
+            if self.first_seq <= seq < self._next_seq:
+                return self._slots[seq % self.capacity]
+        return None
+
+    def read_since(self, seq, limit=None):
+        # 读取序号seq之后的新记录，返回([(序号, 记录)], 下次读取的起始序号)
+        with self._lock:
+            start = max(seq, self.first_seq)
+            end = self._next_seq if limit is None else min(self._next_seq, start + limit)
+            items = [(i, self._slots[i % self.capacity]) for i in range(start, end)]
+        return [(i, record) for i, record in items if record is not None], end
+
+    def snapshot(self):
+        return self.read_since(0)[0]
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._next_seq = 0
+
+
+class LiveCapture:
+    # 连续抓包：通过libpcap直接读取（或由dumpcap将原始pcap流写到管道），后台线程逐帧解码为紧凑记录写入环形缓冲区
+    # 原始帧写入单个output_file，或交给writer（RollingPcapWriter）按大小/时间滚动写入分段
+    # bpf_filter、snaplen、buffer_mb在内核中生效：不匹配的数据包和超出snaplen的部分不会复制到用户态
+    def __init__(self, interface, ring, output_file=None, writer=None,
+                 bpf_filter=None, snaplen=None, buffer_mb=None, backend=None):
+        self.interface = interface
+        self.ring = ring
+        self.output_file = output_file
+        self.writer = writer
+        self.bpf_filter = bpf_filter or None
+        self.snaplen = snaplen or DEFAULT_SNAPLEN
+        self.buffer_mb = buffer_mb
+        # 未指定后端时优先使用libpcap，无法打开网卡（如Python进程没有抓包权限）时改用dumpcap
+        self.backend = backend or (LIBPCAP if pcap is not None else DUMPCAP)
+        self._fallback = backend is None
+        self.stats = None  # 最近一次的CaptureStats，libpcap后端每秒刷新，dumpcap后端在结束时得到
+        self.error = None
+        self._process = None
+        self._handle = None  # libpcap句柄
+        self._handle_lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop_event.clear()
+        self.stats = None
+        self.error = None
+        self._process = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # libpcap后端中断阻塞的读取（没有数据包时读超时不一定生效）；dumpcap后端结束进程使管道关闭，捕包线程随之退出
+        self._stop_event.set()
+        with self._handle_lock:
+            if self._handle is not None:
+                pcap.breakloop(self._handle)
+        while self.running:
+            # dumpcap在捕包线程中启动，可能在停止时才刚刚创建
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+            self._thread.join(0.2)
+        if self._process is not None:
+            self._process.wait()
+
+    def dumpcap_args(self):
+        args = [tshark.get_process_path(process_name='dumpcap'), '-i', self.interface, '-q', '-P',
+                '-s', str(self.snaplen)]
+        if self.buffer_mb:
+            args += ['-B', str(self.buffer_mb)]
+        if self.bpf_filter:
+            args += ['-f', self.bpf_filter]
+        return args + ['-w', '-']
+
+    def _set_stats(self, stats):
+        self.stats = stats
+        KERNEL_RECEIVED.set(stats.received)
+        KERNEL_DROPPED.set(stats.dropped)
+        INTERFACE_DROPPED.set(stats.if_dropped)
+
+    def _open_source(self):
+        # 返回(数据包生成器, (链路类型, snaplen))
+        if self.backend == LIBPCAP:
+            source = self._libpcap_packets()
+            try:
+                return source, next(source)
+            except CaptureError:
+                if not self._fallback:
+                    raise
+                self.backend = DUMPCAP
+        self._process = subprocess.Popen(self.dumpcap_args(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        threading.Thread(target=self._read_dumpcap_stderr, daemon=True).start()
+        source = self._dumpcap_packets()
+        return source, next(source)
+
+    def _read_dumpcap_stderr(self):
+        # dumpcap退出时在标准错误输出接收/丢弃的数据包数，同时持续读取以免管道写满阻塞dumpcap
+        lines = []
+        for line in self._process.stderr:
+            line = line.decode(errors='replace').strip()
+            match = DUMPCAP_STATS.search(line)
+            if match:
+                received, dropped, if_dropped = match.groups()
+                self._set_stats(CaptureStats(int(received), int(dropped), int(if_dropped or 0)))
+            elif line:
+                lines.append(line)
+        if lines and self._process.wait() != 0 and not self._stop_event.is_set():
+            self.error = CaptureError('\n'.join(lines[-5:]))
+
+    def _dumpcap_packets(self):
+        # 先产生(链路类型, snaplen)，随后逐个产生(时间戳, 原始帧)
+        reader = dpkt.pcap.Reader(self._process.stdout)
+        yield reader.datalink(), reader.snaplen
+        for timestamp, buf in reader:
+            if self._stop_event.is_set():
+                break
+            yield float(timestamp), buf
+
+    def _libpcap_packets(self):
+        errbuf = ctypes.create_string_buffer(pcap.PCAP_ERRBUF_SIZE + 1)
+        handle = pcap.create(self.interface.encode(), errbuf)
+        if not handle:
+            raise CaptureError(errbuf.value.decode(errors='replace'))
+        with self._handle_lock:
+            self._handle = handle
+        try:
+            pcap.set_snaplen(handle, self.snaplen)
+            pcap.set_promisc(handle, 1)
+            pcap.set_timeout(handle, READ_TIMEOUT_MS)
+            if self.buffer_mb:
+                pcap.set_buffer_size(handle, self.buffer_mb * 1024 * 1024)
+            if pcap.activate(handle) < 0:
+                raise CaptureError(pcap.geterr(handle).decode(errors='replace'))
+            if self.bpf_filter:
+                program = pcap.bpf_program()
+                if pcap.compile(handle, ctypes.byref(program), self.bpf_filter.encode(), 1,
+                                pcap.PCAP_NETMASK_UNKNOWN) < 0:
+                    raise CaptureError(f'捕获过滤器错误: {pcap.geterr(handle).decode(errors="replace")}')
+                try:
+                    if pcap.setfilter(handle, ctypes.byref(program)) < 0:
+                        raise CaptureError(pcap.geterr(handle).decode(errors='replace'))
+                finally:
+                    pcap.freecode(ctypes.byref(program))
+            yield pcap.datalink(handle), pcap.snapshot(handle)
+
+            header = ctypes.POINTER(pcap.pkthdr)()
+            data = ctypes.POINTER(ctypes.c_ubyte)()
+            stat = pcap.stat()
+            next_stats = 0
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if now >= next_stats:
+                    # 在捕包线程中读取计数，避免与pcap_next_ex并发访问同一句柄
+                    if pcap.stats(handle, ctypes.byref(stat)) == 0:
+                        self._set_stats(CaptureStats(stat.ps_recv, stat.ps_drop, stat.ps_ifdrop))
+                    next_stats = now + STATS_INTERVAL
+                status = pcap.next_ex(handle, ctypes.byref(header), ctypes.byref(data))
+                if status == 0:  # 读超时
+                    continue
+                if status < 0:
+                    if status != -2:  # PCAP_ERROR_BREAK
+                        raise CaptureError(pcap.geterr(handle).decode(errors='replace'))
+                    break
+                packet = header.contents
+                yield packet.ts.tv_sec + packet.ts.tv_usec / 1e6, ctypes.string_at(data, packet.caplen)
+            if pcap.stats(handle, ctypes.byref(stat)) == 0:
+                self._set_stats(CaptureStats(stat.ps_recv, stat.ps_drop, stat.ps_ifdrop))
+        finally:
+            with self._handle_lock:
+                self._handle = None
+                pcap.close(handle)
+
+    def _run(self):
+        output = None
+        source = None
+        packets = flushed = captured_bytes = 0
+        profile = metrics.sync_thread_profile(None)  # 性能分析开启期间统计捕包线程
+        try:
+            source, (datalink, snaplen) = self._open_source()
+            writer = None
+            if self.output_file:
+                output = open(self.output_file, 'wb')
+                writer = dpkt.pcap.Writer(output, snaplen=snaplen, linktype=datalink)
+            if self.writer is not None:
+                self.writer.open(datalink, snaplen)
+            for timestamp, buf in source:
+                packets += 1
+                captured_bytes += len(buf)
+                if packets % metrics.PARSE_SAMPLE:
+                    record = decode_packet(timestamp, buf, datalink)
+                else:
+                    start = time.perf_counter()
+                    record = decode_packet(timestamp, buf, datalink)
+                    PARSE_SECONDS.observe(time.perf_counter() - start)
+                if writer is not None:
+                    writer.writepkt(buf, timestamp)
+                if self.writer is not None:
+                    self.writer.write(buf, timestamp, record)
+                self.ring.push(record)
+                if packets % FLUSH_INTERVAL == 0:
+                    CAPTURE_PACKETS.inc(packets - flushed)
+                    CAPTURE_BYTES.inc(captured_bytes)
+                    flushed, captured_bytes = packets, 0
+                    profile = metrics.sync_thread_profile(profile)
+        except CaptureError as e:
+            self.error = e
+        except (dpkt.NeedData, ValueError, StopIteration) as e:
+            # 进程被结束时管道中可能残留不完整的数据；dumpcap启动失败时保留其标准错误中的原因
+            if not self._stop_event.is_set() and self.error is None:
+                self.error = e
+        finally:
+            CAPTURE_PACKETS.inc(packets - flushed)
+            CAPTURE_BYTES.inc(captured_bytes)
+            if profile is not None and profile[1] is not None:
+                profile[1].disable()
+            if source is not None:
+                source.close()
+            if output is not None:
+                output.close()
+            if self.writer is not None:
+                self.writer.close()
@@ -1,8 +1,8 @@
+import os
 import sys
+import startup
 from PySide6.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton
-from PySide6.QtCore import Qt
-from CaptureView import CaptureView
-from AnalyzeView import AnalyzeView
+from PySide6.QtCore import Qt, QTimer
 
 
 
@@ -49,17 +49,47 @@ class MainWindow(QMainWindow):
         self.button2 = QPushButton("流量分析", self)
         self.button2.setGeometry(680, 400, 200, 50)  # 设置按钮2的位置和大小
         self.button2.clicked.connect(self.open_analyze_view)  # 连接按钮的点击事件到槽函数
-        
+
+        self.button3 = QPushButton("运行统计", self)
+        self.button3.setGeometry(540, 480, 200, 50)  # 设置按钮3的位置和大小
+        self.button3.clicked.connect(self.open_stats_view)  # 连接按钮的点击事件到槽函数
+
+        self.capture_view = None
+        self.analyze_view = None
+        self.stats_view = None
+
     def open_capture_view(self):
-        capture_view = CaptureView()
-       
-        capture_view.show()
-        capture_view.exec()
-    
+        # 首次打开时才导入捕获页面及其依赖，之后复用同一个窗口，不会丢下仍在捕获的窗口
+        if self.capture_view is None:
+            CaptureView = startup.timed_import('CaptureView').CaptureView
+            self.capture_view = CaptureView()
+        show_window(self.capture_view)
+
     def open_analyze_view(self):
-        analyze_view = AnalyzeView()
-        analyze_view.show()
-        analyze_view.exec()
+        # 首次打开时才导入分析页面及其依赖
+        if self.analyze_view is None:
+            AnalyzeView = startup.timed_import('AnalyzeView').AnalyzeView
+            self.analyze_view = AnalyzeView()
+        show_window(self.analyze_view)
+
+    def open_stats_view(self):
+        if self.stats_view is None:
+            StatsView = startup.timed_import('StatsView').StatsView
+            self.stats_view = StatsView()
+        show_window(self.stats_view)
+
+    def closeEvent(self, event):
+        # 关闭主窗口时一并关闭子窗口，停止正在进行的捕获和后台任务
+        for view in (self.capture_view, self.analyze_view, self.stats_view):
+            if view is not None:
+                view.close()
+        super().closeEvent(event)
+
+
+def show_window(window):
+    window.show()
+    window.raise_()
+    window.activateWindow()
 
 
 
@@ -68,4 +98,10 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    startup.log("main window shown")
+    # 设置环境变量SNIFF_METRICS_PORT后在本地提供Prometheus文本格式的指标
+    if os.environ.get('SNIFF_METRICS_PORT'):
+        startup.timed_import('metrics').serve(int(os.environ['SNIFF_METRICS_PORT']))
+    # 主窗口显示后在后台预热模型
+    QTimer.singleShot(0, startup.warm_up_model)
     app.exec()
@@ -0,0 +1,320 @@
+import bisect
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块，不统计内存
+    resource = None
+
+
+# 运行指标：计数器、仪表和直方图，可导出为Prometheus文本格式写入文件或通过本地HTTP端点提供
+# 热点路径上按批次更新（如每批数据包、每次推理），单个数据包的耗时按PARSE_SAMPLE抽样
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+SIZE_BUCKETS = (1, 8, 64, 256, 1024, 4096, 16384, 65536)
+PARSE_SAMPLE = 64  # 每多少个数据包测量一次解析耗时
+DEFAULT_PORT = 9108
+
+
+class Counter:
+    # 单调递增的计数
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    # 可增可减的当前值
+    kind = 'gauge'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    # 按固定分桶累计观测值，分位数取所在分桶的上界
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为+Inf
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.total
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((f'{self.name}_bucket{{le="{le}"}}', cumulative))
+        samples.append((f'{self.name}_sum', total))
+        samples.append((f'{self.name}_count', count))
+        return samples
+
+
+class _Timer:
+    # with histogram.time(): ... 记录代码块耗时（秒）
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []  # 导出前调用，用于刷新内存等按需读取的指标
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, *args):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, *args)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def collect(self):
+        for collector in self.collectors:
+            collector()
+        return list(self.metrics.values())
+
+    def render(self):
+        # Prometheus文本格式
+        lines = []
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name} {value}' for name, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # 先写临时文件再替换，供node_exporter的textfile收集器等读取时不会读到写了一半的文件
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
+write = REGISTRY.write
+
+
+# 捕获页面和分析页面共用
+UI_REFRESH_SECONDS = histogram('sniff_ui_refresh_seconds', '界面每次增量刷新的耗时（秒）')
+RESIDENT_BYTES = gauge('sniff_process_resident_bytes', '进程当前常驻内存（字节）')
+PEAK_RESIDENT_BYTES = gauge('sniff_process_peak_resident_bytes', '进程峰值常驻内存（字节）')
+
+
+def _update_memory():
+    if resource is None:
+        return
+    try:
+        with open('/proc/self/statm') as f:
+            RESIDENT_BYTES.set(int(f.read().split()[1]) * resource.getpagesize())
+    except OSError:
+        pass
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == 'darwin' else peak * 1024
+    PEAK_RESIDENT_BYTES.set(max(peak, RESIDENT_BYTES.value))
+
+
+REGISTRY.collectors.append(_update_memory)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=DEFAULT_PORT, host='127.0.0.1'):
+    # 在后台线程中提供http://host:port/metrics，返回server，调用server.shutdown()停止
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_active_profiler = None  # 正在运行的Profiler，工作线程据此决定是否开启本线程的cProfile
+
+
+class Profiler:
+    # 性能分析开关：cProfile统计界面线程以及通过profile_thread/sync_thread_profile接入的工作线程（后台任务、捕包线程）
+    # 中的函数耗时，各线程的结果合并为一份；tracemalloc统计所有线程的内存分配
+    def __init__(self, output_dir='profiles', top=20):
+        self.output_dir = output_dir
+        self.top = top
+        self._profiles = None  # 各线程的cProfile.Profile
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    @property
+    def running(self):
+        return self._profiles is not None
+
+    def start(self):
+        global _active_profiler
+        if self.running:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profiles = []
+        self.attach()
+        _active_profiler = self
+
+    def attach(self):
+        # 在调用线程中开启cProfile（cProfile只统计开启它的线程），返回该Profile，由该线程在结束分析时disable
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12起cProfile基于sys.monitoring，已开启的分析覆盖所有线程
+            return None
+        with self._lock:
+            if self._profiles is None:
+                profile.disable()
+                return None
+            self._profiles.append(profile)
+        return profile
+
+    def stop(self):
+        # 停止分析，合并各线程的pstats结果写入output_dir，返回(文件路径, 文本报告)
+        global _active_profiler
+        if not self.running:
+            return None, ''
+        if _active_profiler is self:
+            _active_profiler = None
+        with self._lock:
+            profiles, self._profiles = self._profiles, None
+        if profiles:
+            profiles[0].disable()  # 界面线程的Profile，工作线程的由各线程自行关闭
+        snapshot = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, time.strftime('profile-%Y%m%d-%H%M%S.pstats'))
+        stream = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=stream)
+        stats.dump_stats(path)
+        stream.write(f'共统计{len(profiles)}个线程\n')
+        stats.sort_stats('cumulative').print_stats(self.top)
+        lines = [stream.getvalue(), f'内存分配前{self.top}位：']
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:self.top])
+        return path, '\n'.join(lines)
+
+
+def sync_thread_profile(state):
+    # 长时间运行的工作线程定期调用，state为上次的返回值（初始为None）：性能分析开启后在本线程开启cProfile，停止后关闭
+    # state为(本次分析的Profile列表, 本线程的Profile)，Profiler停止后重新开始时列表不同，不会沿用上一次的Profile
+    profiler = _active_profiler
+    profiles = profiler._profiles if profiler is not None else None
+    if state is not None:
+        if state[0] is profiles:
+            return state
+        if state[1] is not None:
+            state[1].disable()
+    return (profiles, profiler.attach()) if profiles is not None else None
+
+
+@contextlib.contextmanager
+def profile_thread():
+    # 在工作线程中执行较短的任务：开始时性能分析已开启则统计任务期间本线程的函数耗时
+    state = sync_thread_profile(None)
+    try:
+        yield
+    finally:
+        if state is not None and state[1] is not None:
+            state[1].disable()
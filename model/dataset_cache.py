@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 训练数据的二进制缓存：分块流式读取CSV，一次遍历计算标准化参数，标准化后的特征以float32内存映射文件保存
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+feature_last = ['Bwd_Packet_Length_Min','Subflow_Fwd_Bytes','Total_Length_of_Fwd_Packets','Fwd_Packet_Length_Mean','Bwd_Packet_Length_Std','Flow_Duration','Flow_IAT_Std','Init_Win_bytes_forward','Bwd_Packets/s',
+                 'PSH_Flag_Count','Average_Packet_Size']
+TARGET = 'Target'
+
+CSV_FILE_PATH = 'model/binary_classification.csv'
+CACHE_DIR = 'model/cache'
+CACHE_VERSION = 1
+
+#每行随机划分到训练集、验证集或测试集，比例与train.py的两次train_test_split相同
+TRAIN, VAL, TEST = 0, 1, 2
+TEST_SIZE = 0.2
+VAL_SIZE = 0.2
+
+FEATURES_FILE = 'features.f32'
+TARGET_FILE = 'target.i8'
+SPLIT_FILE = 'split.i8'
+META_FILE = 'meta.json'
+
+
+class RunningMoments:
+  #按块合并均值和二阶中心矩（Chan等人的并行算法），一次遍历得到均值和标准差
+  def __init__(self, width):
+    self.count = 0
+    self.mean = np.zeros(width)
+    self.m2 = np.zeros(width)
+
+  def update(self, block):
+    n = len(block)
+    if not n:
+      return
+    block = block.astype(np.float64)
+    mean = block.mean(axis=0)
+    m2 = ((block - mean) ** 2).sum(axis=0)
+    total = self.count + n
+    delta = mean - self.mean
+    self.mean = self.mean + delta * n / total
+    self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+    self.count = total
+
+  @property
+  def std(self):
+    return np.sqrt(self.m2 / max(self.count, 1))
+
+
+def _source_identity(csv_path):
+  stat = os.stat(csv_path)
+  return {'csv': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_cache(csv_path=CSV_FILE_PATH, cache_dir=CACHE_DIR, chunksize=200000, seed=0):
+  #第一遍：分块读取CSV，写入原始float32特征、标签和划分，同时累计训练集的均值和标准差
+  os.makedirs(cache_dir, exist_ok=True)
+  rng = np.random.default_rng(seed)
+  moments = RunningMoments(len(feature_last))
+  rows = 0
+  start = time.perf_counter()
+  dtypes = dict.fromkeys(feature_last, np.float32)
+  with open(os.path.join(cache_dir, FEATURES_FILE), 'wb') as features_file, \
+       open(os.path.join(cache_dir, TARGET_FILE), 'wb') as target_file, \
+       open(os.path.join(cache_dir, SPLIT_FILE), 'wb') as split_file:
+    for chunk in pd.read_csv(csv_path, usecols=feature_last + [TARGET], dtype=dtypes, chunksize=chunksize):
+      features = chunk[feature_last].to_numpy(dtype=np.float32, copy=True)
+      features[~np.isfinite(features)] = 0  #Flow_Bytes/s等列中的inf和缺失值
+      draw = rng.random(len(chunk))
+      split = np.where(draw < TEST_SIZE, TEST, np.where(draw < TEST_SIZE + (1 - TEST_SIZE) * VAL_SIZE, VAL, TRAIN)).astype(np.int8)
+      #与train.py一致，标准化参数取自划分验证集之前的训练集
+      moments.update(features[split != TEST])
+      features.tofile(features_file)
+      chunk[TARGET].to_numpy(dtype=np.int8).tofile(target_file)
+      split.tofile(split_file)
+      rows += len(chunk)
+
+  #第二遍：在内存映射上分块原地标准化
+  mean = moments.mean.astype(np.float32)
+  std = np.where(moments.std > 0, moments.std, 1).astype(np.float32)
+  features = np.memmap(os.path.join(cache_dir, FEATURES_FILE), dtype=np.float32, mode='r+', shape=(rows, len(feature_last)))
+  for begin in range(0, rows, chunksize):
+    features[begin:begin + chunksize] = (features[begin:begin + chunksize] - mean) / std
+  features.flush()
+  del features
+
+  meta = dict(_source_identity(csv_path), version=CACHE_VERSION, seed=seed, rows=rows, features=feature_last,
+              mean=moments.mean.tolist(), std=moments.std.tolist())
+  with open(os.path.join(cache_dir, META_FILE), 'w') as f:
+    json.dump(meta, f, indent=2)
+  print('缓存数据集：', rows, '行，用时', round(time.perf_counter() - start, 2), '秒')
+  return meta
+
+
+def load_cache(csv_path=CSV_FILE_PATH, cache_dir=CACHE_DIR, chunksize=200000, seed=0):
+  #返回(标准化后的特征, 标签, 划分, 元数据)，均为只读内存映射；CSV变化时重新生成缓存
+  meta = None
+  try:
+    with open(os.path.join(cache_dir, META_FILE)) as f:
+      meta = json.load(f)
+  except (OSError, ValueError):
+    pass
+  if meta is None or meta.get('version') != CACHE_VERSION or meta.get('seed') != seed or \
+     (os.path.exists(csv_path) and any(meta.get(k) != v for k, v in _source_identity(csv_path).items())):
+    meta = build_cache(csv_path, cache_dir, chunksize, seed)
+  rows = meta['rows']
+  features = np.memmap(os.path.join(cache_dir, FEATURES_FILE), dtype=np.float32, mode='r', shape=(rows, len(feature_last)))
+  target = np.memmap(os.path.join(cache_dir, TARGET_FILE), dtype=np.int8, mode='r', shape=(rows,))
+  split = np.memmap(os.path.join(cache_dir, SPLIT_FILE), dtype=np.int8, mode='r', shape=(rows,))
+  return features, target, split, meta
+
+
+def iterate_batches(features, target, split, part, batch_size, shuffle=False, block_rows=1 << 20, seed=None):
+  #按块读取内存映射，每次只有一个块驻留内存；打乱时块顺序和块内顺序都随机
+  rng = np.random.default_rng(seed)
+  blocks = np.arange(0, len(features), block_rows)
+  if shuffle:
+    rng.shuffle(blocks)
+  for begin in blocks:
+    index = np.flatnonzero(split[begin:begin + block_rows] == part) + begin
+    if shuffle:
+      rng.shuffle(index)
+    x = features[index]
+    y = target[index].astype(np.int32)
+    for i in range(0, len(index), batch_size):
+      yield x[i:i + batch_size], y[i:i + batch_size]
+
+
+def make_dataset(features, target, split, part, batch_size, shuffle=False, block_rows=1 << 20):
+  #稠密float32张量的tf.data管道，生成器在后台预取
+  import tensorflow as tf
+
+  signature = (tf.TensorSpec([None, len(feature_last)], tf.float32), tf.TensorSpec([None], tf.int32))
+  ds = tf.data.Dataset.from_generator(
+    lambda: iterate_batches(features, target, split, part, batch_size, shuffle, block_rows),
+    output_signature=signature)
+  return ds.prefetch(tf.data.AUTOTUNE)
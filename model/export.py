@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 将训练好的模型导出为紧凑的NumPy权重文件（Dense层权重与标准化参数），推理时不再需要导入TensorFlow
+# 每次导出后都用固定批次比较NumPy网络与Keras模型的输出，不一致时删除导出文件并报错
+#   python model/export.py --model Final_Model --verify
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flow_features import feature_last
+from inference import DENSE_ORDER, WEIGHTS_FILE, DetectionModel, NumpyNetwork, Scaler, SCALER_FILE
+
+
+CHECK_ROWS = 256  # 导出自检使用的固定批次行数
+CHECK_TOLERANCE = 1e-4  # 自检允许的最大绝对误差
+
+
+def dense_layers(model):
+  #返回[(kernel, bias, 激活函数名)]，DenseFeatures模型的第一层权重按feature_last顺序重排
+  layers = []
+  permute = False
+  for layer in model.layers:
+    kind = type(layer).__name__
+    if kind == 'DenseFeatures':
+      permute = True
+    elif kind == 'Dense':
+      kernel, bias = layer.get_weights()
+      if permute and not layers:
+        #DenseFeatures按列名排序拼接输入，第j行权重对应feature_last[DENSE_ORDER[j]]
+        reordered = np.empty_like(kernel)
+        reordered[DENSE_ORDER] = kernel
+        kernel = reordered
+      layers.append((kernel, bias, layer.activation.__name__))
+    elif kind not in ('InputLayer', 'Dropout'):
+      raise ValueError(f'不支持导出的层：{kind}')
+  return layers
+
+
+def self_check(model, path, rows=CHECK_ROWS, seed=0):
+  #用固定种子的标准化特征批次比较导出的NumPy网络与Keras模型的输出，返回最大绝对误差
+  #DenseFeatures模型按列名传入字典，由Keras自己排序拼接，因此也检验了DENSE_ORDER的重排
+  network, _ = NumpyNetwork.load(path)
+  features = np.random.default_rng(seed).normal(0, 3, size=(rows, len(feature_last))).astype(np.float32)
+  if model.layers and type(model.layers[0]).__name__ == 'DenseFeatures':
+    inputs = {name: features[:, i] for i, name in enumerate(feature_last)}
+  else:
+    inputs = features
+  expected = np.asarray(model(inputs, training=False), dtype=np.float64)
+  return float(np.abs(expected - network(features)).max())
+
+
+def export_model(model, mean, std, output_dir, tolerance=CHECK_TOLERANCE):
+  #mean和std按feature_last顺序排列，写入output_dir/weights.npz；导出后自检，tolerance为None时跳过
+  layers = dense_layers(model)
+  arrays = {'activations': np.array([activation for _, _, activation in layers]),
+            'features': np.array(feature_last),
+            'mean': np.asarray(mean, dtype=np.float32),
+            'std': np.asarray(std, dtype=np.float32)}
+  for i, (kernel, bias, _) in enumerate(layers):
+    arrays[f'kernel_{i}'] = kernel.astype(np.float32)
+    arrays[f'bias_{i}'] = bias.astype(np.float32)
+  path = os.path.join(output_dir, WEIGHTS_FILE)
+  np.savez(path, **arrays)
+  if tolerance is not None:
+    error = self_check(model, path)
+    if error > tolerance:
+      #不保留错误的权重，避免推理时优先使用
+      os.remove(path)
+      raise ValueError(f'导出的NumPy网络与模型输出不一致，最大绝对误差{error:.3g}')
+  return path
+
+
+def verify(model_path, samples=10000, seed=0):
+  #比较NumPy后端与SavedModel的输出，返回(最大绝对误差, 类别一致的比例)
+  reference = DetectionModel(model_path, backend='tf')
+  exported = DetectionModel(model_path, backend='numpy')
+  reference.load()
+  rng = np.random.default_rng(seed)
+  scaler = reference.scaler or Scaler(np.zeros(len(feature_last)), np.ones(len(feature_last)))
+  features = np.abs(rng.normal(scaler.mean, scaler.std * 3, size=(samples, len(feature_last))))
+  expected = reference.predict(features)
+  actual = exported.predict(features)
+  return float(np.abs(expected - actual).max()), float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='导出NumPy推理权重')
+  parser.add_argument('--model', default='Final_Model', help='SavedModel目录，导出文件写入同一目录')
+  parser.add_argument('--verify', action='store_true', help='导出后再用随机特征比较两个推理后端的输出')
+  parser.add_argument('--tolerance', type=float, default=CHECK_TOLERANCE)
+  parser.add_argument('--no-check', action='store_true', help='跳过导出后的固定批次自检')
+  args = parser.parse_args(argv)
+
+  import tensorflow as tf
+
+  model = tf.keras.models.load_model(args.model)
+  scaler_path = os.path.join(args.model, SCALER_FILE)
+  if os.path.exists(scaler_path):
+    scaler = Scaler.load(scaler_path)
+  else:
+    print(scaler_path, '不存在，导出的权重不做标准化')
+    scaler = Scaler(np.zeros(len(feature_last)), np.ones(len(feature_last)))
+  try:
+    path = export_model(model, scaler.mean, scaler.std, args.model, None if args.no_check else args.tolerance)
+  except ValueError as e:
+    print(e)
+    return 1
+  print('已导出：', path)
+
+  if args.verify:
+    error, agreement = verify(args.model)
+    print('最大绝对误差：', error, '类别一致：', agreement)
+    if error > args.tolerance:
+      print('NumPy后端与SavedModel的输出不一致')
+      return 1
+  return 0
+
+
+if __name__ == '__main__':
+  raise SystemExit(main())
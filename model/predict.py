@@ -1,5 +1,10 @@
+import os
+import sys
+
 import pandas as pd
-import tensorflow as tf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference import CLASS_NAMES, DetectionModel
 
 # 读取csv文件
 df = pd.read_csv('model/binary_classification_new.csv')
@@ -19,19 +24,17 @@ dataset['Label'] = data_result
 dataset.to_csv('model/binary_classification_new.csv', index=False)
 
 
-# 加载保存的模型
-reconstructed_model = tf.keras.models.load_model('Final_Model')
+# 加载保存的模型（存在导出的weights.npz时使用NumPy推理，不导入TensorFlow）
+reconstructed_model = DetectionModel('Final_Model')
 
 # 进行推断
-inference_ds = tf.data.Dataset.from_tensor_slices(dict(dataset)).batch(1)
-predictions = reconstructed_model.predict(inference_ds)
+predictions = reconstructed_model.predict(dataset[feature_last].to_numpy())
 
 
 
 # 输出预测结果
-class_names = ['Class1', 'Class2', 'Class3', 'Class4']
 for prediction in predictions:
-    predicted_class = class_names[prediction.argmax()]
+    predicted_class = CLASS_NAMES[prediction.argmax()]
     if predicted_class == 'Class1':
         print('受到攻击')
     else:
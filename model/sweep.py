@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 超参数搜索：多个进程并行训练不同配置，每个进程固定TensorFlow线程数，共用同一份标准化后的二进制缓存
+#   python model/sweep.py --workers 4 --batch-sizes 1024,4096 --widths 20,64 --depths 2,4 --learning-rates 0.001,0.003
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dataset_cache import CACHE_DIR, CSV_FILE_PATH, load_cache
+
+LEADERBOARD_FIELDS = ['batch_size', 'width', 'depth', 'learning_rate', 'accuracy', 'recall', 'f1', 'train_time', 'infer_time']
+
+
+def _init_worker(threads):
+  #在导入TensorFlow之前固定线程数，避免多个进程争抢全部核心
+  os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+  os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+  os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+  os.environ['OMP_NUM_THREADS'] = str(threads)
+  import tensorflow as tf
+
+  tf.config.threading.set_intra_op_parallelism_threads(threads)
+  tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_config(config, csv_path, cache_dir, epochs):
+  #工作进程：以内存映射读取缓存，训练并评估一个配置
+  import tensorflow as tf
+  from dataset_cache import TEST, TRAIN, VAL, make_dataset
+  from train_stream import build_model, evaluate
+
+  features, target, split, _ = load_cache(csv_path, cache_dir)
+  batch_size = config['batch_size']
+  train_ds = make_dataset(features, target, split, TRAIN, batch_size, shuffle=True)
+  val_ds = make_dataset(features, target, split, VAL, batch_size)
+  test_ds = make_dataset(features, target, split, TEST, batch_size)
+
+  model = build_model(tf, config['width'], config['depth'], config['learning_rate'])
+  start = time.perf_counter()
+  model.fit(train_ds, validation_data=val_ds, epochs=epochs, verbose=0)
+  train_time = time.perf_counter() - start
+  metrics = evaluate(model, test_ds)
+  return dict(config, train_time=train_time, **metrics)
+
+
+def parse_list(text, kind):
+  return [kind(value) for value in text.split(',') if value]
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='并行超参数搜索')
+  parser.add_argument('--csv', default=CSV_FILE_PATH)
+  parser.add_argument('--cache-dir', default=CACHE_DIR)
+  parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 1) // 2, 1), help='并行训练的进程数')
+  parser.add_argument('--threads', type=int, default=0, help='每个进程的TensorFlow线程数，0表示平分CPU核心')
+  parser.add_argument('--epochs', type=int, default=10)
+  parser.add_argument('--batch-sizes', default='1024,4096')
+  parser.add_argument('--widths', default='20,64')
+  parser.add_argument('--depths', default='2,4')
+  parser.add_argument('--learning-rates', default='0.001,0.003')
+  parser.add_argument('--output', default='model/leaderboard.csv', help='排行榜CSV文件')
+  args = parser.parse_args(argv)
+
+  #在主进程中生成一次缓存，工作进程直接映射读取
+  load_cache(args.csv, args.cache_dir)
+
+  configs = [
+    {'batch_size': b, 'width': w, 'depth': d, 'learning_rate': lr}
+    for b, w, d, lr in itertools.product(parse_list(args.batch_sizes, int), parse_list(args.widths, int),
+                                         parse_list(args.depths, int), parse_list(args.learning_rates, float))
+  ]
+  threads = args.threads or max((os.cpu_count() or 1) // args.workers, 1)
+  print(len(configs), '个配置，', args.workers, '个进程，每个进程', threads, '个线程')
+
+  results = []
+  #使用spawn启动工作进程，保证线程设置在TensorFlow初始化之前生效
+  context = multiprocessing.get_context('spawn')
+  with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                           initializer=_init_worker, initargs=(threads,)) as executor:
+    futures = [executor.submit(train_config, config, args.csv, args.cache_dir, args.epochs) for config in configs]
+    for future in as_completed(futures):
+      result = future.result()
+      results.append(result)
+      print({k: round(v, 4) if isinstance(v, float) else v for k, v in result.items()})
+
+  results.sort(key=lambda r: (r['f1'], r['accuracy']), reverse=True)
+  with open(args.output, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=LEADERBOARD_FIELDS)
+    writer.writeheader()
+    writer.writerows(results)
+  print('排行榜已写入', args.output)
+  return 0
+
+
+if __name__ == '__main__':
+  raise SystemExit(main())
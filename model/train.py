@@ -15,6 +15,8 @@ from keras import layers
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import f1_score, recall_score
 import datetime
+import json
+from export import export_model
 
 start_time = datetime.datetime.now()
 
@@ -118,8 +120,11 @@ model.fit(train_ds,
 loss, accuracy = model.evaluate(test_ds)
 print("loss:",loss)
 print("Accuracy:", accuracy)
-print("recall:",recall_score)
-print("FPR:",f1_score)
+#在测试集上计算召回率和F1（多分类取宏平均）
+test_labels = np.concatenate([labels.numpy() for _, labels in test_ds])
+test_predictions = model.predict(test_ds).argmax(axis=1)
+print("recall:",recall_score(test_labels, test_predictions, average='macro'))
+print("F1:",f1_score(test_labels, test_predictions, average='macro'))
 
 end_time = datetime.datetime.now()
 print("spend_time:",(end_time-start_time).seconds)
@@ -127,8 +132,16 @@ print("spend_time:",(end_time-start_time).seconds)
 #保存模型
 
 model.save('Final_Model')
+
+#保存训练集的均值和标准差，推理时使用相同的参数进行标准化
+with open(os.path.join('Final_Model', 'scaler.json'), 'w') as f:
+  json.dump({'features': feature_last,
+             'mean': train_mean.tolist(),
+             'std': train_std.tolist()}, f, indent=2)
+#导出NumPy推理权重，检测时无需加载TensorFlow
+export_model(model, train_mean, train_std, 'Final_Model')
 begin_time = datetime.datetime.now()
-reconstructed_model = tf.keras.models.load_model('New_Final_Model')
+reconstructed_model = tf.keras.models.load_model('Final_Model')
 
 reconstructed_model.evaluate(test_ds)
 
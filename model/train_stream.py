@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding=UTF-8
+# 流式训练：从二进制缓存读取标准化后的稠密特征，内存占用与数据集大小无关
+#   python model/train_stream.py --batch-size 4096 --epochs 20
+import argparse
+import json
+import os
+import time
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score, recall_score
+
+from dataset_cache import CACHE_DIR, CSV_FILE_PATH, TEST, TRAIN, VAL, feature_last, load_cache, make_dataset
+from export import export_model
+
+
+def build_model(tf, width=20, depth=4, learning_rate=0.001):
+  #与train.py相同的selu全连接网络，输入为按feature_last排列的(N, 11)稠密矩阵
+  model = tf.keras.Sequential([tf.keras.Input(shape=(len(feature_last),), dtype=tf.float32)])
+  for _ in range(depth):
+    model.add(tf.keras.layers.Dense(width, activation='selu'))
+  model.add(tf.keras.layers.Dense(4, activation='softmax'))
+  model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate),
+                loss='sparse_categorical_crossentropy',
+                metrics=['accuracy'],
+                steps_per_execution=16)
+  return model
+
+
+def epoch_timer(tf):
+  #记录每个epoch的墙钟时间
+  class EpochTimer(tf.keras.callbacks.Callback):
+    def on_train_begin(self, logs=None):
+      self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+      self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+      self.times.append(time.perf_counter() - self._start)
+      print('epoch', epoch + 1, '用时', round(self.times[-1], 2), '秒')
+
+  return EpochTimer()
+
+
+def evaluate(model, dataset):
+  #在测试集上计算准确率、召回率、F1和推理时间
+  start = time.perf_counter()
+  labels, predictions = [], []
+  for x, y in dataset:
+    predictions.append(model.predict_on_batch(x).argmax(axis=1))
+    labels.append(y.numpy())
+  infer_time = time.perf_counter() - start
+  labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.int32)
+  predictions = np.concatenate(predictions) if predictions else np.empty(0, dtype=np.int64)
+  return {
+    'accuracy': accuracy_score(labels, predictions),
+    'recall': recall_score(labels, predictions, average='macro', zero_division=0),
+    'f1': f1_score(labels, predictions, average='macro', zero_division=0),
+    'infer_time': infer_time,
+  }
+
+
+def save_model(model, meta, output):
+  model.save(output)
+  #保存训练集的均值和标准差，推理时使用相同的参数进行标准化
+  with open(os.path.join(output, 'scaler.json'), 'w') as f:
+    json.dump({'features': feature_last, 'mean': meta['mean'], 'std': meta['std']}, f, indent=2)
+  #同时导出NumPy推理权重
+  export_model(model, meta['mean'], meta['std'], output)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='基于二进制缓存的流式训练')
+  parser.add_argument('--csv', default=CSV_FILE_PATH)
+  parser.add_argument('--cache-dir', default=CACHE_DIR)
+  parser.add_argument('--chunksize', type=int, default=200000, help='读取CSV的分块行数')
+  parser.add_argument('--batch-size', type=int, default=4096)
+  parser.add_argument('--epochs', type=int, default=20)
+  parser.add_argument('--width', type=int, default=20)
+  parser.add_argument('--depth', type=int, default=4)
+  parser.add_argument('--learning-rate', type=float, default=0.001)
+  parser.add_argument('--output', default='Final_Model')
+  args = parser.parse_args(argv)
+
+  import tensorflow as tf
+
+  features, target, split, meta = load_cache(args.csv, args.cache_dir, args.chunksize)
+  print(meta['rows'], 'examples')
+  train_ds = make_dataset(features, target, split, TRAIN, args.batch_size, shuffle=True)
+  val_ds = make_dataset(features, target, split, VAL, args.batch_size)
+  test_ds = make_dataset(features, target, split, TEST, args.batch_size)
+
+  model = build_model(tf, args.width, args.depth, args.learning_rate)
+  timer = epoch_timer(tf)
+  start = time.perf_counter()
+  model.fit(train_ds, validation_data=val_ds, epochs=args.epochs, callbacks=[timer], verbose=2)
+  print('训练用时：', round(time.perf_counter() - start, 2), '秒')
+
+  metrics = evaluate(model, test_ds)
+  print('Accuracy:', metrics['accuracy'])
+  print('recall:', metrics['recall'])
+  print('F1:', metrics['f1'])
+  print('推理用时：', round(metrics['infer_time'], 2), '秒')
+
+  save_model(model, meta, args.output)
+  return 0
+
+
+if __name__ == '__main__':
+  raise SystemExit(main())
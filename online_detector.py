@@ -0,0 +1,72 @@
+import dpkt
+
+import metrics
+from flow_features import FlowTable
+from inference import get_model, CLASS_NAMES
+
+
+TH_FIN_RST = dpkt.tcp.TH_FIN | dpkt.tcp.TH_RST
+FLOW_TABLE_SIZE = metrics.gauge('sniff_flow_table_size', '实时检测流表中的活动流数')
+SCORED_FLOWS = metrics.counter('sniff_scored_flows_total', '实时检测已打分的流数')
+ALERTS = metrics.counter('sniff_alerts_total', '实时检测产生的告警数')
+
+
+class OnlineDetector:
+    # 实时检测：每次只把新到达的数据包累加到流表，结束或超时的流攒成一批送入模型
+    def __init__(self, model=None, idle_timeout=15, active_timeout=120):
+        self.model = model
+        self.idle_timeout = idle_timeout  # 流空闲超时（秒）
+        self.active_timeout = active_timeout  # 流最长持续时间（秒）
+        self.flows = FlowTable()
+        self.now = None  # 当前时间：最近一个数据包的时间戳，没有新数据包时由tick传入的时钟推进
+        self._closed = set()  # 出现FIN/RST的流
+        self.scored_flows = 0
+
+    def update(self, packets):
+        for packet in packets:
+            key = self.flows.add(packet)
+            if packet.flags & TH_FIN_RST:
+                self._closed.add(key)
+            self.now = packet.timestamp
+
+    def tick(self, now=None):
+        # 取出已结束或超时的流批量打分，返回告警列表[(五元组, 类别名, 概率)]
+        # now为当前时钟（如time.time()），链路空闲没有新数据包时空闲的流仍能按时超时
+        if self.now is None:
+            return []
+        if now is not None:
+            self.now = max(self.now, now)
+        finished = self.flows.pop(self._closed)
+        self._closed.clear()
+        finished += self.flows.expire(self.now, self.idle_timeout, self.active_timeout)
+        FLOW_TABLE_SIZE.set(len(self.flows))
+        return self._score(finished)
+
+    def flush(self):
+        # 停止捕获时对剩余的流打分
+        finished = list(self.flows.flows.items())
+        self.flows.flows.clear()
+        self._closed.clear()
+        FLOW_TABLE_SIZE.set(0)
+        return self._score(finished)
+
+    def reset(self):
+        self.flows = FlowTable()
+        self.now = None
+        self._closed.clear()
+        self.scored_flows = 0
+
+    def _score(self, finished):
+        if not finished:
+            return []
+        tuples, matrix = self.flows.feature_matrix(finished)
+        model = self.model or get_model()
+        labels, probabilities = model.classify(matrix)
+        self.scored_flows += len(tuples)
+        SCORED_FLOWS.inc(len(tuples))
+        alerts = [
+            (flow, CLASS_NAMES[label], float(probabilities[i, label]))
+            for i, (flow, label) in enumerate(zip(tuples, labels)) if label != 0
+        ]
+        ALERTS.inc(len(alerts))
+        return alerts
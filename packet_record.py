@@ -0,0 +1,149 @@
+import socket
+import sys
+from collections import namedtuple
+
+import dpkt
+
+
+IP_CACHE_SIZE = 65536  # 地址字符串缓存的上限，超过后清空重建
+
+
+class PacketRecord:
+    # 单个数据包的紧凑记录，替代pyshark基于XML的完整解析对象；__slots__避免每个实例的属性字典
+    __slots__ = (
+        'timestamp',    # 捕获时间戳（秒）
+        'src',          # 源IP（驻留字符串，同一地址的所有记录共享一个对象）
+        'dst',          # 目的IP
+        'sport',        # 源端口（非TCP/UDP时为None）
+        'dport',        # 目的端口（非TCP/UDP时为None）
+        'proto',        # 传输层协议：'TCP'、'UDP'或None
+        'length',       # 帧长度
+        'flags',        # TCP标志位（非TCP时为0）
+        'window',       # TCP窗口大小（非TCP时为None）
+        'payload_len',  # 传输层载荷长度
+    )
+
+    def __init__(self, timestamp, src, dst, sport, dport, proto, length, flags, window, payload_len):
+        self.timestamp = timestamp
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.proto = proto
+        self.length = length
+        self.flags = flags
+        self.window = window
+        self.payload_len = payload_len
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, PacketRecord):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'PacketRecord(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__) + ')'
+
+    def __reduce__(self):
+        return PacketRecord, tuple(self)
+
+    @classmethod
+    def from_dpkt(cls, timestamp, ip, link_len=0, captured_len=0):
+        # 由dpkt解析出的IP/IPv6层转换，link_len为链路头长度，captured_len为捕获到的帧长度
+        if isinstance(ip, dpkt.ip.IP):
+            ip_len = ip.len
+            header_len = ip.hl * 4
+        else:
+            ip_len = ip.plen + 40
+            header_len = 40 + sum(len(ext) for ext in ip.all_extension_headers)
+        # 截断抓包时按IP头中的长度还原帧长度
+        length = max(captured_len, link_len + ip_len)
+
+        transport = ip.data
+        if isinstance(transport, dpkt.tcp.TCP):
+            return cls(
+                timestamp, intern_ip(ip.src), intern_ip(ip.dst),
+                transport.sport, transport.dport, 'TCP', length,
+                transport.flags, transport.win,
+                max(ip_len - header_len - transport.off * 4, 0),
+            )
+        if isinstance(transport, dpkt.udp.UDP):
+            return cls(
+                timestamp, intern_ip(ip.src), intern_ip(ip.dst),
+                transport.sport, transport.dport, 'UDP', length,
+                0, None, max(transport.ulen - 8, 0),
+            )
+        return cls(
+            timestamp, intern_ip(ip.src), intern_ip(ip.dst),
+            None, None, None, length, 0, None, max(ip_len - header_len, 0),
+        )
+
+    @classmethod
+    def from_pyshark(cls, packet):
+        # 由pyshark的Packet对象转换，只保留检测和显示需要的字段，非IP数据包返回None
+        layer = getattr(packet, 'ip', None) or getattr(packet, 'ipv6', None)
+        if layer is None:
+            return None
+        proto = packet.transport_layer if packet.transport_layer in ('TCP', 'UDP') else None
+        sport = dport = window = None
+        flags = payload_len = 0
+        if proto == 'TCP':
+            tcp = packet.tcp
+            sport, dport = int(tcp.srcport), int(tcp.dstport)
+            flags = int(tcp.flags, 16)
+            window = int(tcp.window_size_value)
+            payload_len = int(tcp.len)
+        elif proto == 'UDP':
+            udp = packet.udp
+            sport, dport = int(udp.srcport), int(udp.dstport)
+            payload_len = max(int(udp.length) - 8, 0)
+        return cls(
+            float(packet.sniff_timestamp), intern_ip(layer.src), intern_ip(layer.dst),
+            sport, dport, proto, int(packet.length), flags, window, payload_len,
+        )
+
+
+_ip_cache = {}
+
+
+def intern_ip(address):
+    # 地址（原始字节或字符串）转换为驻留的字符串，重复出现的地址不再重复分配
+    text = _ip_cache.get(address)
+    if text is None:
+        if len(_ip_cache) >= IP_CACHE_SIZE:
+            _ip_cache.clear()
+        if isinstance(address, str):
+            text = sys.intern(address)
+        elif len(address) == 4:
+            text = sys.intern('%d.%d.%d.%d' % tuple(address))
+        else:
+            text = sys.intern(socket.inet_ntop(socket.AF_INET6, address))
+        _ip_cache[address] = text
+    return text
+
+
+_new_tuple = tuple.__new__
+
+
+class FlowKey(namedtuple('FlowKey', ['a_ip', 'a_port', 'b_ip', 'b_port', 'proto'])):
+    # 双向五元组流键：两端按(IP, 端口)排序，扁平的元组可直接哈希，IP为驻留字符串
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, packet):
+        # 返回流键和当前数据包所在的一端（0为a端发出）
+        src, sport, dst, dport = packet.src, packet.sport, packet.dst, packet.dport
+        # 直接构造元组，跳过namedtuple的Python层__new__
+        if (src, sport or 0) <= (dst, dport or 0):
+            return _new_tuple(cls, (src, sport, dst, dport, packet.proto)), 0
+        return _new_tuple(cls, (dst, dport, src, sport, packet.proto)), 1
+
+    def oriented(self, side):
+        # 以side一端为源，返回(源IP, 源端口, 目的IP, 目的端口, 协议)
+        if side:
+            return (self.b_ip, self.b_port, self.a_ip, self.a_port, self.proto)
+        return (self.a_ip, self.a_port, self.b_ip, self.b_port, self.proto)
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+# 分析表格展示的字段
+COLUMNS = ["Source IP", "Destination IP", "Protocol", "Length", "Source Port", "Destination Port"]
+
+
+class PacketStore:
+    # 按列存储数据包记录：追加写入预分配的NumPy缓冲区，容量不足时成倍扩容，
+    # 最后一次性生成DataFrame，避免逐行pd.concat带来的平方级开销
+    def __init__(self, capacity=4096):
+        self._size = 0
+        self._src = np.empty(capacity, dtype=np.int32)  # 源IP编码
+        self._dst = np.empty(capacity, dtype=np.int32)  # 目的IP编码
+        self._proto = np.empty(capacity, dtype=np.int8)  # 协议编码，-1表示无传输层
+        self._length = np.empty(capacity, dtype=np.int32)
+        self._sport = np.empty(capacity, dtype=np.int32)  # -1表示无端口
+        self._dport = np.empty(capacity, dtype=np.int32)
+
+        # IP和协议的取值表，内存只随不同取值的数量增长
+        self._ips = []
+        self._ip_codes = {}
+        self._protos = []
+        self._proto_codes = {}
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        capacity = max(len(self._length) * 2, 1)
+        for name in ('_src', '_dst', '_proto', '_length', '_sport', '_dport'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _ip_code(self, ip):
+        code = self._ip_codes.get(ip)
+        if code is None:
+            code = self._ip_codes[ip] = len(self._ips)
+            self._ips.append(ip)
+        return code
+
+    def _proto_code(self, proto):
+        if proto is None:
+            return -1
+        code = self._proto_codes.get(proto)
+        if code is None:
+            code = self._proto_codes[proto] = len(self._protos)
+            self._protos.append(proto)
+        return code
+
+    def append(self, packet):
+        # 追加一条PacketRecord
+        if self._size == len(self._length):
+            self._grow()
+        i = self._size
+        self._src[i] = self._ip_code(packet.src)
+        self._dst[i] = self._ip_code(packet.dst)
+        self._proto[i] = self._proto_code(packet.proto)
+        self._length[i] = packet.length
+        self._sport[i] = -1 if packet.sport is None else packet.sport
+        self._dport[i] = -1 if packet.dport is None else packet.dport
+        self._size = i + 1
+
+    def extend(self, packets):
+        for packet in packets:
+            self.append(packet)
+
+    @classmethod
+    def concat(cls, stores):
+        # 按顺序拼接多个分片的数据，IP和协议编码映射到合并后的取值表
+        result = cls(capacity=max(sum(len(store) for store in stores), 1))
+        for store in stores:
+            n = len(store)
+            i = result._size
+            ip_map = np.array([result._ip_code(ip) for ip in store._ips], dtype=np.int32)
+            # 协议编码-1（无传输层）映射到最后一位，保持为-1
+            proto_map = np.array([result._proto_code(proto) for proto in store._protos] + [-1], dtype=np.int8)
+            if n:
+                result._src[i:i + n] = ip_map[store._src[:n]]
+                result._dst[i:i + n] = ip_map[store._dst[:n]]
+                result._proto[i:i + n] = proto_map[store._proto[:n]]
+                result._length[i:i + n] = store._length[:n]
+                result._sport[i:i + n] = store._sport[:n]
+                result._dport[i:i + n] = store._dport[:n]
+            result._size = i + n
+        return result
+
+    @classmethod
+    def from_arrays(cls, arrays, ips, protos):
+        # 由各列数组（可以是只读的内存映射）和取值表重建，继续追加时会复制到新缓冲区
+        store = cls(capacity=0)
+        store._size = len(arrays['length'])
+        for name in ('src', 'dst', 'proto', 'length', 'sport', 'dport'):
+            setattr(store, '_' + name, arrays[name])
+        store._ips = list(ips)
+        store._ip_codes = {ip: code for code, ip in enumerate(store._ips)}
+        store._protos = list(protos)
+        store._proto_codes = {proto: code for code, proto in enumerate(store._protos)}
+        return store
+
+    @property
+    def ips(self):
+        return self._ips
+
+    @property
+    def protos(self):
+        return self._protos
+
+    def arrays(self):
+        # 各列的NumPy视图，IP和协议为编码值
+        n = self._size
+        return {
+            'src': self._src[:n],
+            'dst': self._dst[:n],
+            'proto': self._proto[:n],
+            'length': self._length[:n],
+            'sport': self._sport[:n],
+            'dport': self._dport[:n],
+        }
+
+    def ip_code(self, ip):
+        # 查询IP的编码，不存在时返回None
+        return self._ip_codes.get(ip)
+
+    def proto_code(self, proto):
+        return self._proto_codes.get(proto)
+
+    def to_dataframe(self):
+        # IP和协议列使用分类类型，端口列使用可空整数类型
+        import pandas as pd
+
+        n = self._size
+        sport = self._sport[:n].copy()
+        dport = self._dport[:n].copy()
+        return pd.DataFrame({
+            "Source IP": pd.Categorical.from_codes(self._src[:n], categories=self._ips),
+            "Destination IP": pd.Categorical.from_codes(self._dst[:n], categories=self._ips),
+            "Protocol": pd.Categorical.from_codes(self._proto[:n], categories=self._protos),
+            "Length": self._length[:n].copy(),
+            "Source Port": pd.arrays.IntegerArray(sport, sport < 0),
+            "Destination Port": pd.arrays.IntegerArray(dport, dport < 0),
+        }, columns=COLUMNS)
@@ -0,0 +1,147 @@
+import os
+import time
+import warnings
+
+import dpkt
+
+import metrics
+from packet_record import PacketRecord
+
+
+# 常见链路层类型
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_LOOP = 108
+DLT_LINUX_SLL = 113
+DLT_IPV4 = 228
+DLT_IPV6 = 229
+DLT_LINUX_SLL2 = 276
+
+TH_PUSH = dpkt.tcp.TH_PUSH
+
+
+def _network_layer(buf, datalink):
+    # 根据链路层类型剥离链路头，返回IP层对象及链路头长度
+    if datalink == DLT_EN10MB:
+        frame = dpkt.ethernet.Ethernet(buf)
+    elif datalink == DLT_LINUX_SLL:
+        frame = dpkt.sll.SLL(buf)
+    elif datalink == DLT_LINUX_SLL2:
+        frame = dpkt.sll2.SLL2(buf)
+    elif datalink in (DLT_NULL, DLT_LOOP):
+        frame = dpkt.loopback.Loopback(buf)
+    elif datalink in (DLT_RAW, DLT_IPV4, DLT_IPV6, 12, 14):
+        if not buf:
+            return None, 0
+        version = buf[0] >> 4
+        if version == 4:
+            return dpkt.ip.IP(buf), 0
+        if version == 6:
+            return dpkt.ip6.IP6(buf), 0
+        return None, 0
+    else:
+        return None, 0
+    ip = frame.data
+    if isinstance(ip, (dpkt.ip.IP, dpkt.ip6.IP6)):
+        return ip, len(buf) - len(ip)
+    return None, 0
+
+
+def decode_packet(timestamp, buf, datalink=DLT_EN10MB):
+    # 将一帧原始数据解码为PacketRecord，非IP数据包返回None
+    try:
+        ip, link_len = _network_layer(buf, datalink)
+    except (dpkt.UnpackError, IndexError):
+        return None
+    if ip is None:
+        return None
+    return PacketRecord.from_dpkt(timestamp, ip, link_len, len(buf))
+
+
+PROGRESS_INTERVAL = 8192  # 每读取多少帧报告一次进度
+FILE_PACKETS = metrics.counter('sniff_file_packets_total', '从抓包文件读取的帧数')
+PARSE_SECONDS = metrics.histogram('sniff_parse_seconds', '单帧解码耗时（秒，抽样）')
+
+
+def complete_frames(reader, file_path):
+    # 逐个产生(时间戳, 原始帧)；文件在记录中间截断（抓包进程被结束、分段仍在写入）时
+    # 在最后一条完整记录处停止并发出警告，与tshark的处理方式一致
+    frames = 0
+    try:
+        for frames, frame in enumerate(reader, 1):
+            yield frame
+    except (dpkt.NeedData, dpkt.UnpackError) as e:
+        warnings.warn(f'{file_path}在第{frames + 1}帧处截断，只读取了前{frames}帧（{type(e).__name__}）')
+
+
+def is_pcap(file_path):
+    # 是否为dpkt可以直接读取的pcap/pcapng文件
+    with open(file_path, 'rb') as f:
+        try:
+            dpkt.pcap.UniversalReader(f)
+        except ValueError:
+            return False
+    return True
+
+
+def read_pcap(file_path, progress=None):
+    # 单次遍历pcap/pcapng文件，逐个产生IP数据包的PacketRecord；其他抓包格式交给tshark解析
+    # progress(已读取字节数, 文件大小)定期调用，可在其中抛出异常中止读取
+    if not is_pcap(file_path):
+        yield from read_with_tshark(file_path, progress)
+        return
+    with open(file_path, 'rb') as f:
+        reader = dpkt.pcap.UniversalReader(f)
+        datalink = reader.datalink()
+        size = os.fstat(f.fileno()).st_size
+        i = 0
+        try:
+            for i, (timestamp, buf) in enumerate(complete_frames(reader, file_path), 1):
+                if i % metrics.PARSE_SAMPLE:
+                    record = decode_packet(float(timestamp), buf, datalink)
+                else:
+                    # 抽样测量解码耗时；PROGRESS_INTERVAL是PARSE_SAMPLE的整数倍，进度也只在这里检查
+                    start = time.perf_counter()
+                    record = decode_packet(float(timestamp), buf, datalink)
+                    PARSE_SECONDS.observe(time.perf_counter() - start)
+                    if i % PROGRESS_INTERVAL == 0:
+                        FILE_PACKETS.inc(PROGRESS_INTERVAL)
+                        if progress is not None:
+                            progress(f.tell(), size)
+                if record is not None:
+                    yield record
+        finally:
+            FILE_PACKETS.inc(i % PROGRESS_INTERVAL)
+        if progress is not None:
+            progress(size, size)
+
+
+def read_with_tshark(file_path, progress=None):
+    # dpkt无法识别的抓包格式（snoop、ERF等）的后备方案：由pyshark/tshark解析后转换为PacketRecord，速度远慢于dpkt
+    import pyshark
+
+    cap = pyshark.FileCapture(file_path, keep_packets=False)
+    try:
+        for packet in cap:
+            record = PacketRecord.from_pyshark(packet)
+            if record is not None:
+                yield record
+    finally:
+        cap.close()
+    if progress is not None:
+        size = os.path.getsize(file_path)
+        progress(size, size)
+
+
+def dissect_packet(file_path, frame_number):
+    # 深度解析的后备方案：仅在需要完整协议树时才调用pyshark/tshark
+    import pyshark
+
+    cap = pyshark.FileCapture(file_path, display_filter=f'frame.number == {frame_number}')
+    try:
+        for packet in cap:
+            return str(packet)
+    finally:
+        cap.close()
+    return ''
@@ -0,0 +1,249 @@
+import glob
+import json
+import os
+import threading
+from array import array
+
+import dpkt
+import numpy as np
+
+from packet_record import FlowKey
+
+
+SEGMENT_BYTES = 64 * 1024 * 1024  # 单个分段文件的最大字节数
+SEGMENT_SECONDS = 300  # 单个分段覆盖的最长时间（秒）
+PCAP_HEADER_LEN = 24
+COPY_CHUNK = 1 << 20
+
+INDEX_SUFFIX = '.idx.npy'  # 每个数据包的(时间戳, 文件偏移)
+META_SUFFIX = '.json'  # 时间范围、帧序号范围和流键
+
+
+class Segment:
+    # 一个pcap分段及其索引：按帧顺序记录每个数据包的时间戳和文件偏移
+    # 写入中的分段在内存中维护索引，关闭并写出旁路索引后释放，之后只保留时间范围和包数，需要时从.idx.npy映射读取
+    def __init__(self, path, first_frame=0):
+        self.path = path
+        self.first_frame = first_frame  # 本分段第一帧在整个捕获中的序号（从0开始）
+        self.count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.size = PCAP_HEADER_LEN
+        self.timestamps = array('d')
+        self.offsets = array('q')
+        self.flows = set()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, timestamp, offset, size, record=None):
+        self.timestamps.append(timestamp)
+        self.offsets.append(offset)
+        if self.first_ts is None:
+            self.first_ts = timestamp
+        self.last_ts = timestamp
+        self.size = offset + size
+        self.count += 1
+        if record is not None:
+            self.flows.add(FlowKey.of(record)[0])
+
+    def overlaps(self, start=None, end=None):
+        if not self.count:
+            return False
+        return (start is None or self.last_ts >= start) and (end is None or self.first_ts <= end)
+
+    def index(self, count=None):
+        # 返回前count个数据包的(时间戳数组, 偏移数组)；写入中的分段复制内存中的索引，已关闭的分段映射读取.idx.npy
+        count = self.count if count is None else count
+        timestamps, offsets = self.timestamps, self.offsets
+        if timestamps is not None:
+            # 切片在持有GIL时完成，捕包线程同时追加也不影响已写入的部分
+            return np.array(timestamps[:count], dtype=np.float64), np.array(offsets[:count], dtype=np.int64)
+        index = np.load(self.path + INDEX_SUFFIX, mmap_mode='r')[:count]
+        return index['timestamp'], index['offset']
+
+    def byte_range(self, start=None, end=None, count=None, size=None):
+        # 时间窗口内数据包所在的连续字节区间[begin, stop)，没有数据包时返回None
+        # count/size为持锁时记下的包数和文件大小，写入中的分段只导出到该位置为止
+        size = self.size if size is None else size
+        timestamps, offsets = self.index(count)
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        hits = np.flatnonzero(mask)
+        if not len(hits):
+            return None
+        first, last = hits[0], hits[-1] + 1
+        stop = int(offsets[last]) if last < len(offsets) else size
+        return int(offsets[first]), stop, last - first
+
+    def save_index(self):
+        index = np.empty(len(self), dtype=[('timestamp', '<f8'), ('offset', '<i8')])
+        index['timestamp'] = self.timestamps
+        index['offset'] = self.offsets
+        np.save(self.path + INDEX_SUFFIX, index)
+        with open(self.path + META_SUFFIX, 'w') as f:
+            json.dump({
+                'first_frame': self.first_frame,
+                'packets': len(self),
+                'first_ts': self.first_ts,
+                'last_ts': self.last_ts,
+                'size': self.size,
+                'flows': [list(key) for key in self.flows],
+            }, f)
+        self.release()
+
+    def release(self):
+        # 释放内存中的索引和流键，长时间捕获时内存占用不随分段数增长
+        self.timestamps = None
+        self.offsets = None
+        self.flows = None
+
+    @classmethod
+    def load(cls, path):
+        # 只读取元数据，索引在导出时按需映射读取
+        with open(path + META_SUFFIX) as f:
+            meta = json.load(f)
+        segment = cls(path, meta['first_frame'])
+        segment.count = meta['packets']
+        segment.first_ts = meta['first_ts']
+        segment.last_ts = meta['last_ts']
+        segment.size = meta['size']
+        segment.release()
+        return segment
+
+    def remove(self):
+        for path in (self.path, self.path + INDEX_SUFFIX, self.path + META_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class RollingPcapWriter:
+    # 按大小或时间滚动写入编号的pcap分段，每个分段关闭时写出旁路索引
+    def __init__(self, directory, prefix='capture', max_bytes=SEGMENT_BYTES, max_seconds=SEGMENT_SECONDS, max_segments=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_segments = max_segments  # 保留的分段数上限，超过时删除最旧的分段
+        self.segments = []
+        self._number = 0  # 下一个分段的编号
+        self.frames = 0  # 已写入的帧总数
+        self._linktype = None
+        self._snaplen = None
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return self.segments[-1] if self._file is not None else None
+
+    def open(self, linktype, snaplen=65535):
+        os.makedirs(self.directory, exist_ok=True)
+        self._linktype = linktype
+        self._snaplen = snaplen
+
+    def _roll(self):
+        self._close_segment()
+        path = os.path.join(self.directory, f'{self.prefix}-{self._number:05d}.pcap')
+        self._number += 1
+        self._file = open(path, 'wb')
+        self._writer = dpkt.pcap.Writer(self._file, snaplen=self._snaplen, linktype=self._linktype)
+        self.segments.append(Segment(path, self.frames))
+        if self.max_segments and len(self.segments) > self.max_segments:
+            self.segments.pop(0).remove()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+            self.segments[-1].save_index()
+
+    def write(self, buf, timestamp, record=None):
+        # 写入一帧；record为解码后的记录，用于索引流键（非IP帧为None）
+        with self._lock:
+            segment = self.current
+            if segment is None or (len(segment) and (
+                    segment.size + len(buf) + 16 > self.max_bytes
+                    or timestamp - segment.first_ts >= self.max_seconds)):
+                self._roll()
+                segment = self.segments[-1]
+            offset = self._file.tell()
+            self._writer.writepkt(buf, timestamp)
+            segment.add(float(timestamp), offset, 16 + len(buf), record)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def last_timestamp(self):
+        # 最后写入的数据包的时间戳，捕获过程中可从界面线程调用
+        with self._lock:
+            return self.segments[-1].last_ts if self.segments else None
+
+    def locate(self, frame):
+        # 由整个捕获中的帧序号（从0开始）找到(分段文件, 分段内帧号（从1开始）)
+        with self._lock:
+            for segment in self.segments:
+                if segment.first_frame <= frame < segment.first_frame + len(segment):
+                    return segment.path, frame - segment.first_frame + 1
+        return None
+
+    def export(self, output, start=None, end=None):
+        # 导出时间窗口[start, end]内的数据包，捕获过程中也可调用
+        # 只在持锁时刷新文件并记下分段列表和写入中分段的包数、大小，复制在锁外进行，不阻塞捕包线程写入
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            segments = list(self.segments)
+            bounds = {id(segments[-1]): (len(segments[-1]), segments[-1].size)} if self._file is not None else {}
+        return export_segments(segments, output, start, end, bounds)
+
+
+def load_segments(directory, prefix='capture'):
+    # 读取目录中已关闭的分段及其索引
+    segments = []
+    for path in sorted(glob.glob(os.path.join(directory, f'{prefix}-*.pcap'))):
+        if os.path.exists(path + META_SUFFIX):
+            segments.append(Segment.load(path))
+    return segments
+
+
+def export_segments(segments, output, start=None, end=None, bounds=None):
+    # 只打开与时间窗口重叠的分段，按索引定位字节区间后直接复制，不重新解析数据包；返回导出的包数
+    # bounds为{id(分段): (包数, 文件大小)}，限定写入中的分段只导出到调用时已写入的位置
+    bounds = bounds or {}
+    segments = [segment for segment in segments if segment.overlaps(start, end)]
+    packets = 0
+    with open(output, 'wb') as out:
+        if not segments:
+            return 0
+        # 所有分段的文件头相同，取最新的分段（不会被滚动删除）
+        with open(segments[-1].path, 'rb') as f:
+            out.write(f.read(PCAP_HEADER_LEN))
+        for segment in segments:
+            try:
+                span = segment.byte_range(start, end, *bounds.get(id(segment), (None, None)))
+                if span is None:
+                    continue
+                f = open(segment.path, 'rb')
+            except FileNotFoundError:
+                # 导出过程中超过max_segments被删除的最旧分段
+                continue
+            begin, stop, count = span
+            with f:
+                f.seek(begin)
+                remaining = stop - begin
+                while remaining > 0:
+                    chunk = f.read(min(COPY_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            packets += int(count)
+    return packets
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import dpkt
+
+from flow_features import FlowTable
+from packet_store import PacketStore
+from pcap_reader import complete_frames, decode_packet, is_pcap, read_pcap
+
+
+PCAPNG_BLOCK_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAP_MAGICS = (0xA1B2C3D4, 0xA1B23C4D)
+
+
+def _record_length_reader(f):
+    # 根据文件头返回(记录头长度, 由记录头计算整条记录长度的函数)
+    head = f.read(12)
+    f.seek(0)
+    if struct.unpack('<I', head[:4])[0] == PCAPNG_BLOCK_SHB:
+        order = '<' if struct.unpack('<I', head[8:12])[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+        return 8, lambda header: struct.unpack(order + 'I', header[4:8])[0]
+    order = '<' if struct.unpack('<I', head[:4])[0] in PCAP_MAGICS else '>'
+    return 16, lambda header: 16 + struct.unpack(order + 'I', header[8:12])[0]
+
+
+def split_shards(file_path, shards):
+    # 只扫描记录头找到数据包（块）边界，按字节数把文件均分为若干[start, end)区间
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb', buffering=1 << 20) as f:
+        header_len, record_length = _record_length_reader(f)
+        dpkt.pcap.UniversalReader(f)
+        start = f.tell()  # 跳过文件头（pcapng为SHB和IDB）后的第一条记录
+        targets = [start + (size - start) * i // shards for i in range(1, shards)]
+        bounds = [start]
+        position = start
+        while targets and position < size:
+            if position >= targets[0]:
+                bounds.append(position)
+                while targets and targets[0] <= position:
+                    targets.pop(0)
+            f.seek(position)
+            header = f.read(header_len)
+            if len(header) < header_len:
+                break
+            position += record_length(header)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def analyze_shard(file_path, start, end):
+    # 解析一个分片：生成该分片的列式数据包表和部分流表
+    store = PacketStore()
+    flows = FlowTable()
+    with open(file_path, 'rb', buffering=1 << 20) as f:
+        reader = dpkt.pcap.UniversalReader(f)
+        datalink = reader.datalink()
+        f.seek(start)
+        for timestamp, buf in complete_frames(reader, file_path):
+            record = decode_packet(float(timestamp), buf, datalink)
+            if record is not None:
+                store.append(record)
+                flows.add(record)
+            if f.tell() >= end:
+                break
+    return store, flows
+
+
+def analyze_pcap(file_path, workers=None, progress=None):
+    # 多进程分片解析大文件，按分片顺序合并结果，与单进程解析的结果完全一致
+    # progress(已完成分片数, 分片总数)在每个分片完成后调用，可在其中抛出异常中止解析
+    workers = workers or os.cpu_count() or 1
+    if not is_pcap(file_path):
+        # 其他抓包格式无法按记录头分片，由read_pcap交给tshark解析
+        store, flows = PacketStore(), FlowTable()
+        for record in read_pcap(file_path):
+            store.append(record)
+            flows.add(record)
+        return store, flows
+    shards = split_shards(file_path, workers)
+    results = []
+    if len(shards) <= 1:
+        results = [analyze_shard(file_path, *shard) for shard in shards]
+    else:
+        # 由界面的后台线程调用，在多线程进程中fork可能复制被其他线程持有的锁（Qt、模型等），使用spawn启动工作进程
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as executor:
+            futures = [executor.submit(analyze_shard, file_path, start, end) for start, end in shards]
+            try:
+                for future in futures:
+                    results.append(future.result())
+                    if progress is not None:
+                        progress(len(results), len(shards))
+            except BaseException:
+                # 中止时不再启动尚未开始的分片
+                for future in futures:
+                    future.cancel()
+                raise
+
+    flows = FlowTable()
+    for _, shard_flows in results:
+        flows.merge(shard_flows)
+    store = PacketStore.concat([shard_store for shard_store, _ in results])
+    return store, flows
@@ -0,0 +1,59 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+
+# 启动耗时统计：设置环境变量SNIFF_STARTUP_REPORT=1后输出每个模块的导入耗时
+REPORT_ENABLED = os.environ.get('SNIFF_STARTUP_REPORT') == '1'
+PROCESS_START = time.perf_counter()
+
+import_times = {}  # 模块名→首次导入耗时（秒）
+
+
+def log(message):
+    if REPORT_ENABLED:
+        print(f'[startup {time.perf_counter() - PROCESS_START:8.3f}s] {message}', file=sys.stderr)
+
+
+def timed_import(name):
+    # 导入模块并记录首次导入的耗时
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - start
+    log(f'import {name}: {import_times[name]:.3f}s')
+    return module
+
+
+def report():
+    # 按耗时从高到低排列的导入耗时报告
+    lines = [f'{name:<24}{seconds:8.3f}s' for name, seconds in sorted(import_times.items(), key=lambda item: -item[1])]
+    return '\n'.join(lines)
+
+
+def warm_up_model():
+    # 在后台线程中导入TensorFlow（需要时）、加载模型并执行一次推理，失败时不影响界面；完成后输出导入耗时报告
+    def run():
+        try:
+            inference = timed_import('inference')
+            model = inference.get_model()
+            if model.needs_tensorflow:
+                # 单独计时，不计入模型加载耗时
+                timed_import('tensorflow')
+            start = time.perf_counter()
+            model.load()
+            log(f'model load ({model.backend}): {time.perf_counter() - start:.3f}s')
+            start = time.perf_counter()
+            model.warm_up()
+            log(f'model warm-up: {time.perf_counter() - start:.3f}s')
+        except Exception as e:
+            log(f'model warm-up failed: {e!r}')
+        finally:
+            log('import times:\n' + report())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
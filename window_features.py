@@ -0,0 +1,161 @@
+from collections import deque
+
+import numpy as np
+
+from flow_features import RunningStats, feature_last, to_microseconds
+from host_report import HOST, PAIR
+from inference import CLASS_NAMES
+from pcap_reader import TH_PUSH
+
+
+class WindowStats:
+    # 一台主机在当前时间窗口内的统计量：数据包进入窗口时累加、离开时扣除，
+    # 计数、求和与平方和均为整数因而可以精确扣除，最小值由单调队列维护
+    __slots__ = ('entries', 'lengths', 'iat', 'psh_flags', 'bwd_min', 'fwd_windows', '_seq')
+
+    def __init__(self):
+        self.entries = deque()  # (序号, 时间戳, 方向, 载荷长度, 与前一个数据包的间隔, 是否PSH)
+        self.lengths = (RunningStats(), RunningStats())  # 发送/接收方向的载荷长度
+        self.iat = RunningStats()  # 窗口内相邻数据包的到达时间间隔
+        self.psh_flags = 0
+        self.bwd_min = deque()  # 接收方向载荷长度的单调递增队列(序号, 长度)
+        self.fwd_windows = deque()  # 发送方向数据包的(序号, TCP窗口)，队首即窗口内的初始窗口
+        self._seq = 0
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def add(self, timestamp, side, length, flags, window):
+        seq = self._seq
+        self._seq += 1
+        iat = None
+        if self.entries:
+            iat = timestamp - self.entries[-1][1]
+            self.iat.add(iat)
+        psh = bool(flags & TH_PUSH)
+        self.entries.append((seq, timestamp, side, length, iat, psh))
+        self.lengths[side].add(length)
+        self.psh_flags += psh
+        if side:
+            while self.bwd_min and self.bwd_min[-1][1] >= length:
+                self.bwd_min.pop()
+            self.bwd_min.append((seq, length))
+        elif window is not None:
+            self.fwd_windows.append((seq, window))
+
+    def evict(self, before):
+        # 移除时间戳早于before的数据包
+        entries = self.entries
+        while entries and entries[0][1] < before:
+            seq, _, side, length, _, psh = entries.popleft()
+            self.lengths[side].remove(length)
+            self.psh_flags -= psh
+            if self.bwd_min and self.bwd_min[0][0] == seq:
+                self.bwd_min.popleft()
+            if self.fwd_windows and self.fwd_windows[0][0] == seq:
+                self.fwd_windows.popleft()
+            if entries:
+                # 新的队首与被移除数据包之间的间隔不再属于窗口
+                self.iat.remove(entries[0][4])
+
+    def features(self):
+        # 与FlowStats.features相同的特征定义，统计范围为当前窗口
+        fwd, bwd = self.lengths
+        duration = self.entries[-1][1] - self.entries[0][1] if self.entries else 0
+        packets = fwd.count + bwd.count
+        return [
+            self.bwd_min[0][1] if self.bwd_min else 0,
+            fwd.total,
+            fwd.total,
+            fwd.total / fwd.count if fwd.count else 0,
+            bwd.std(),
+            duration,
+            self.iat.std(),
+            self.fwd_windows[0][1] if self.fwd_windows else -1,
+            bwd.count / (duration / 1e6) if duration > 0 else 0,
+            self.psh_flags,
+            (fwd.total + bwd.total) / packets if packets else 0,
+        ]
+
+
+class WindowedFeatureExtractor:
+    # 按时间窗口为每台主机（或每个有向主机对）生成特征向量：窗口长度window秒，每step秒输出一次，
+    # step等于window时为滚动窗口。每个数据包只进入和离开窗口各一次，总代价与数据包数呈线性
+    def __init__(self, window=10, step=1, mode=HOST):
+        if step <= 0 or window <= 0:
+            raise ValueError('窗口长度和步长必须大于0')
+        self.window = to_microseconds(window)
+        self.step = to_microseconds(step)
+        self.mode = mode
+        self.hosts = {}  # 窗口内有数据包的主机
+        self._next_end = None  # 下一个窗口的结束时间
+
+    def add(self, packet):
+        # 累加一个数据包（需按时间顺序），返回此前已结束的窗口[(窗口开始时间, 主机, 特征向量)]
+        if packet.proto != 'TCP':
+            return []
+        timestamp = to_microseconds(packet.timestamp)
+        if self._next_end is None:
+            self._next_end = timestamp + self.window
+        rows = []
+        while timestamp >= self._next_end:
+            rows.extend(self._emit())
+            if not self.hosts and timestamp >= self._next_end:
+                # 长时间没有数据包，直接跳到第一个包含当前数据包的窗口
+                self._next_end += (timestamp - self._next_end) // self.step * self.step + self.step
+        if self.mode == PAIR:
+            sides = (((packet.src, packet.dst), 0), ((packet.dst, packet.src), 1))
+        else:
+            sides = ((packet.src, 0), (packet.dst, 1))
+        for key, side in sides:
+            stats = self.hosts.get(key)
+            if stats is None:
+                stats = self.hosts[key] = WindowStats()
+            stats.add(timestamp, side, packet.payload_len, packet.flags, packet.window)
+        return rows
+
+    def _emit(self):
+        # 输出结束于_next_end的窗口，然后窗口前移一个步长
+        end = self._next_end
+        start = end - self.window
+        rows = []
+        for key in list(self.hosts):
+            stats = self.hosts[key]
+            stats.evict(start)
+            if stats:
+                rows.append((start / 1e6, key, stats.features()))
+            else:
+                del self.hosts[key]
+        self._next_end = end + self.step
+        return rows
+
+    def flush(self):
+        # 输出包含最后一个数据包的窗口
+        return self._emit() if self.hosts else []
+
+    def extend(self, packets):
+        for packet in packets:
+            yield from self.add(packet)
+        yield from self.flush()
+
+
+def window_feature_matrix(packets, window=10, step=1, mode=HOST):
+    # 返回(窗口开始时间数组, 主机列表, 特征矩阵)，每个窗口中每台活动主机一行
+    starts, keys, rows = [], [], []
+    for start, key, features in WindowedFeatureExtractor(window, step, mode).extend(packets):
+        starts.append(start)
+        keys.append(key)
+        rows.append(features)
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_last))
+    return np.array(starts, dtype=np.float64), keys, matrix
+
+
+def score_windows(packets, model, window=10, step=1, mode=HOST):
+    # 所有窗口的特征向量一次批量推断，返回按时间排列的检测时间线
+    starts, keys, features = window_feature_matrix(packets, window, step, mode)
+    if len(keys):
+        labels, probabilities = model.classify(features)
+    else:
+        labels = np.zeros(0, dtype=np.int64)
+        probabilities = np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+    return starts, keys, features, labels, probabilities